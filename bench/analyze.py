@@ -0,0 +1,61 @@
+"""
+Time of `calculate_report` on the decimal and float backends, on synthetic grade
+books of 1,000 to 100,000 items.
+
+The report cache is cleared before every call, so each time covers hashing the
+items and calculating the report; the time of a cache hit is shown apart.
+
+    python -m bench.analyze [--items 1000 20000 100000]
+"""
+
+import argparse
+
+import grade.server.analyze as analyze
+from grade.server.analyze import calculate_report, to_backend, to_display
+from grade.spider import parse_grade_book_items_df
+from .upstream import best_of, course_data, table
+
+
+def uncached(df) -> analyze.GradeReport:
+    analyze._reports.clear()
+    return calculate_report(df)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--items", type=int, nargs="+", default=[1000, 20_000, 100_000]
+    )
+    args = parser.parse_args()
+
+    rows = []
+    for n in args.items:
+        df = parse_grade_book_items_df(*course_data(n))
+        frames = {backend: to_backend(df, backend) for backend in ("decimal", "float")}
+        assert to_display(uncached(frames["float"])["score"]) == to_display(
+            uncached(frames["decimal"])["score"]
+        )
+        times = {
+            backend: best_of(lambda: uncached(frame), repeat=3)
+            for backend, frame in frames.items()
+        }
+        calculate_report(frames["float"])
+        hit = best_of(lambda: calculate_report(frames["float"]), repeat=3)
+        rows.append(
+            [
+                n,
+                f"{best_of(lambda: to_backend(df, 'float'), repeat=3) * 1000:.1f}",
+                f"{times['decimal'] * 1000:.1f}",
+                f"{times['float'] * 1000:.1f}",
+                f"{times['decimal'] / times['float']:.1f}x",
+                f"{hit * 1000:.2f}",
+            ]
+        )
+    table(
+        ["items", "to float ms", "decimal ms", "float ms", "speedup", "cached ms"],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Throughput of fetching the courses of many users at once, with the course lock
+scoped to each session against one lock shared by every session, as before.
+
+Every user logs in first, then all of them fetch all their courses at once
+against a fake StudentVUE with a fixed latency per request. Each course is
+checked against the data upstream, so interleaved course loads of one user would
+show up as errors.
+
+    python -m bench.courses [--latency 0.02] [--courses 4] [--users 1 4 16 64]
+"""
+
+import argparse
+import asyncio
+import time
+
+import grade.spider.spider as spider
+from grade.server.serialize import dumps
+from grade.spider import GradeBook, iter_grade_book_items, manager
+from grade.spider.parse import parse_grade_book_items_df
+from .upstream import Upstream, table
+
+
+async def fetch_all(users: list[str]) -> list[tuple[int, GradeBook | Exception]]:
+    async def fetch(user: str) -> list[tuple[int, GradeBook | Exception]]:
+        return [r async for r in iter_grade_book_items(user, "pw", force=True)]
+
+    return [r for rs in await asyncio.gather(*map(fetch, users)) for r in rs]
+
+
+def count_errors(results: list, upstream: Upstream) -> int:
+    expected = {
+        course_id: dumps(GradeBook(parse_grade_book_items_df(*data)))
+        for course_id, data in upstream.courses.items()
+    }
+    return sum(
+        not isinstance(result, GradeBook) or dumps(result) != expected[course_id]
+        for course_id, result in results
+    )
+
+
+async def run(n_users: int, shared_lock: bool, upstream: Upstream) -> list:
+    users = [f"user{i}" for i in range(n_users)]
+    course_lock = spider.course_lock
+    if shared_lock:
+        lock = asyncio.Lock()
+        spider.course_lock = lambda s: lock
+    try:
+        await asyncio.gather(*(manager.get_session(user, "pw") for user in users))
+        start = time.perf_counter()
+        results = await fetch_all(users)
+        elapsed = time.perf_counter() - start
+    finally:
+        spider.course_lock = course_lock
+        await manager.cleanup()
+    return [
+        n_users,
+        "shared" if shared_lock else "per session",
+        f"{elapsed:.2f}",
+        f"{len(results) / elapsed:.1f}",
+        count_errors(results, upstream),
+    ]
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--courses", type=int, default=4)
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument(
+        "--limit-per-host",
+        type=int,
+        default=manager.connector_options["limit_per_host"],
+        help="connections to one host, 0 for no limit",
+    )
+    args = parser.parse_args()
+
+    manager.connector_options["limit_per_host"] = args.limit_per_host
+    upstream = Upstream(latency=args.latency, n_courses=args.courses)
+    await upstream.start()
+    rows = []
+    try:
+        for n_users in args.users:
+            for shared_lock in (True, False):
+                rows.append(await run(n_users, shared_lock, upstream))
+    finally:
+        await upstream.stop()
+    table(["users", "course lock", "seconds", "courses/s", "errors"], rows)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
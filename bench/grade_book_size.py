@@ -0,0 +1,76 @@
+"""
+Bytes per item of a course cached as a column-backed `GradeBook`, against the
+same items as a list of `GradeBookItem` dicts.
+
+Sizes are measured both by `sizeof`, which follows containers and counts shared
+objects once, and by the memory tracemalloc sees retained after building each
+from the parsed DataFrame.
+
+    python -m bench.grade_book_size [--items 50 500 5000 50000]
+"""
+
+import argparse
+import gc
+import tracemalloc
+from collections.abc import Callable
+from typing import Any
+
+from grade.server.serialize import dumps
+from grade.spider import GradeBook, parse_grade_book_items_df
+from grade.spider.parse import grade_book_items_df_to_records
+from grade.utils import sizeof
+from .upstream import course_data, table
+
+
+def retained(build: Callable[[], Any]) -> tuple[Any, int]:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        o = build()
+        gc.collect()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return o, size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--items", type=int, nargs="+", default=[50, 500, 5000, 50_000]
+    )
+    args = parser.parse_args()
+
+    rows = []
+    for n in args.items:
+        df = parse_grade_book_items_df(*course_data(n))
+        records, records_traced = retained(lambda: grade_book_items_df_to_records(df))
+        grade_book, grade_book_traced = retained(lambda: GradeBook(df))
+        # NaN never equals itself, so the items are compared as served
+        assert dumps(grade_book) == dumps(records)
+        records_size, grade_book_size = sizeof(records), sizeof(grade_book)
+        rows.append(
+            [
+                n,
+                f"{records_size / n:.0f}",
+                f"{grade_book_size / n:.0f}",
+                f"{records_traced / n:.0f}",
+                f"{grade_book_traced / n:.0f}",
+                f"{records_size / grade_book_size:.1f}x",
+            ]
+        )
+    table(
+        [
+            "items",
+            "dicts B/item",
+            "GradeBook B/item",
+            "dicts traced",
+            "GradeBook traced",
+            "ratio",
+        ],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Parsing the grade book items of courses with 50 to 50,000 items, column by column
+against the per-row `df.apply` it replaced.
+
+    python -m bench.parse_items [--items 50 500 50000]
+"""
+
+import argparse
+import itertools as it
+from datetime import datetime
+from functools import cache
+
+import pandas as pd
+
+from grade.spider import parse_grade_book_items, parse_grade_book_items_df
+from grade.spider.model import Comment, GradeBookItem, MeasureType
+from grade.spider.parse import parse_comments, parse_measure_types
+from grade.utils import first, get, identifier, to_decimal
+from .upstream import best_of, course_data, table
+
+
+def old_parse_grade_book_items(
+    class_data: dict[str, any],
+    items_data: dict[str, any],
+) -> list[GradeBookItem]:
+    # the parser as it was, with a row-wise apply and linear lookups
+    items_df = pd.DataFrame(
+        list(it.chain(*get(items_data, "responseData.data.*.items")))
+    ).rename(identifier, axis="columns")
+    assignments_df = pd.DataFrame(class_data.get("assignments", [])).rename(
+        identifier, axis="columns"
+    )
+    df = pd.merge(
+        items_df,
+        assignments_df,
+        left_on="item_id",
+        right_on="grade_book_id",
+        validate="one_to_one",
+    )
+    comments = parse_comments(class_data)
+
+    @cache
+    def get_comment_by_code(code) -> Comment:
+        return first(filter(lambda c: c.get("code") == code, comments))
+
+    measure_types = parse_measure_types(class_data)
+
+    @cache
+    def get_measure_type_by_id(id) -> MeasureType:
+        return first(filter(lambda mt: mt.get("id") == id, measure_types))
+
+    def transform(series: pd.Series) -> GradeBookItem:
+        comment = get_comment_by_code(series.comment_code)
+        # guarded here, as the old parser failed on a text without a code
+        if series.comment_text and comment:
+            comment["content"] = series.comment_text
+        measure_type = get_measure_type_by_id(series.measure_type_id)
+        return GradeBookItem(
+            id=series.grade_book_id,
+            name=series.title,
+            points=to_decimal(series.points),
+            max_points=to_decimal(series.max_value),
+            score=to_decimal(series.score),
+            max_score=to_decimal(series.max_score),
+            due_date=datetime.fromisoformat(series.due_date_x),
+            is_for_grade=series.is_for_grading,
+            is_hidden=series.hide_in_portal,
+            is_missing=series.is_grade_book_missing_mark,
+            measure_type=measure_type,
+            comment=comment,
+        )
+
+    return df.apply(transform, axis="columns").tolist()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, nargs="+", default=[50, 500, 50_000])
+    args = parser.parse_args()
+
+    rows = []
+    for n in args.items:
+        data = course_data(n)
+        repeat = 3 if n > 5000 else 5
+        old, df, records = (
+            best_of(lambda: fn(*data), repeat=repeat)
+            for fn in (
+                old_parse_grade_book_items,
+                parse_grade_book_items_df,
+                parse_grade_book_items,
+            )
+        )
+        rows.append(
+            [
+                n,
+                f"{old * 1000:.1f}",
+                f"{df * 1000:.1f}",
+                f"{records * 1000:.1f}",
+                f"{old / records:.1f}x",
+            ]
+        )
+    table(["items", "apply ms", "df ms", "records ms", "speedup"], rows)
+
+
+if __name__ == "__main__":
+    main()
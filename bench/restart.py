@@ -0,0 +1,69 @@
+"""
+Time to first byte after a restart, with sessions restored from the session
+store (warm) against logging everyone in again (cold).
+
+Each user asks for their courses right after the restart, against a fake
+StudentVUE with a fixed latency per request. A cold start logs in and runs the
+handshake; a warm start only probes the stored session with the grade book page.
+
+    python -m bench.restart [--latency 0.05] [--users 1 8 32]
+"""
+
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+
+from grade.spider import SessionStore, get_courses, manager
+from .upstream import Upstream, table
+
+
+async def first_bytes(users: list[str]) -> list[float]:
+    start = time.perf_counter()
+
+    async def first_byte(user: str) -> float:
+        await get_courses(user, "pw")
+        return time.perf_counter() - start
+
+    return await asyncio.gather(*map(first_byte, users))
+
+
+async def restart(path: str, users: list[str], upstream: Upstream) -> list:
+    # a new store, as after a restart, so no derived key is reused
+    manager.store = SessionStore(path)
+    requests = upstream.requests
+    times = await first_bytes(users)
+    requests = upstream.requests - requests
+    # saves every session to the store, as on shutdown
+    await manager.cleanup()
+    return [
+        f"{statistics.mean(times) * 1000:.0f}",
+        f"{max(times) * 1000:.0f}",
+        f"{requests / len(users):.0f}",
+    ]
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 8, 32])
+    args = parser.parse_args()
+
+    upstream = Upstream(latency=args.latency)
+    await upstream.start()
+    rows = []
+    try:
+        for n_users in args.users:
+            users = [f"user{i}" for i in range(n_users)]
+            with tempfile.TemporaryDirectory() as path:
+                rows.append([n_users, "cold", *await restart(path, users, upstream)])
+                rows.append([n_users, "warm", *await restart(path, users, upstream)])
+    finally:
+        manager.store = None
+        await upstream.stop()
+    table(["users", "start", "mean ms", "max ms", "requests/user"], rows)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
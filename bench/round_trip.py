@@ -0,0 +1,92 @@
+"""
+Round trip of grade book items through a DataFrame, with `records_to_df` and
+`df_to_records` against the `explode` and `condense` they replaced.
+
+    python -m bench.round_trip [--items 100 1000 10000]
+"""
+
+import argparse
+from typing import get_type_hints
+
+import pandas as pd
+from pandas import DataFrame
+
+from grade.server.analyze import df_to_grade_book_items, grade_book_items_to_df
+from grade.spider import parse_grade_book_items
+from grade.spider.model import Comment, GradeBookItem, MeasureType
+from .upstream import best_of, course_data, table
+
+
+def explode(df: pd.DataFrame, col: str, type: type) -> DataFrame:
+    return df.assign(
+        **{
+            f"{col}_{k}": df[col].apply(lambda dct: (dct or {}).get(k))
+            for k in list(get_type_hints(type).keys())
+        }
+    ).drop(col, axis=1)
+
+
+def condense(df: pd.DataFrame, col: str, type: type) -> DataFrame:
+    return df.assign(
+        **{
+            col: df.apply(
+                lambda row: {
+                    k: row[f"{col}_{k}"] for k in list(get_type_hints(type).keys())
+                },
+                axis=1,
+            )
+        }
+    ).drop([f"{col}_{k}" for k in list(get_type_hints(type).keys())], axis=1)
+
+
+def old_to_df(grade_book_items: list[GradeBookItem]) -> pd.DataFrame:
+    df = DataFrame(grade_book_items)
+    df = explode(df, "comment", Comment)
+    df = explode(df, "measure_type", MeasureType)
+    return df.set_index("id")
+
+
+def old_to_items(df: pd.DataFrame) -> list[GradeBookItem]:
+    df = condense(df, "comment", Comment)
+    df = condense(df, "measure_type", MeasureType)
+    return df.to_dict(orient="records")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, nargs="+", default=[100, 1000, 10_000])
+    args = parser.parse_args()
+
+    rows = []
+    for n in args.items:
+        items = parse_grade_book_items(*course_data(n))
+        old_df, new_df = old_to_df(items), grade_book_items_to_df(items)
+        pd.testing.assert_frame_equal(old_df, new_df[old_df.columns])
+        # the old records lost the id with the index
+        without_id = [
+            {k: v for k, v in item.items() if k != "id"}
+            for item in df_to_grade_book_items(new_df)
+        ]
+        assert old_to_items(old_df) == without_id
+
+        times = [
+            best_of(lambda: old_to_df(items)),
+            best_of(lambda: old_to_items(old_df)),
+            best_of(lambda: grade_book_items_to_df(items)),
+            best_of(lambda: df_to_grade_book_items(new_df)),
+        ]
+        rows.append(
+            [
+                n,
+                *(f"{t * 1000:.1f}" for t in times),
+                f"{(times[0] + times[1]) / (times[2] + times[3]):.1f}x",
+            ]
+        )
+    table(
+        ["items", "explode ms", "condense ms", "to df ms", "to records ms", "speedup"],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
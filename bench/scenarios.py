@@ -0,0 +1,114 @@
+"""
+Scoring 10^5 what-if scenarios for the next 3 tests of a course in one broadcast
+with `WhatIf.scenarios`, against looping `calculate_what_if` and against one
+incremental `WhatIf.update` per scenario.
+
+The loops are timed on a sample of the scenarios and reported per scenario.
+
+    python -m bench.scenarios [--scenarios 100000] [--items 200] [--sample 200]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from grade.server.analyze import calculate_score, grade_book_items_to_df
+from grade.server.what_if import (
+    WhatIf,
+    grid_points,
+    normal,
+    percentiles,
+    sample_points,
+)
+from grade.spider import parse_grade_book_items
+from grade.utils import to_decimal
+from .upstream import best_of, course_data, table
+
+TESTS = 3
+
+
+def per_scenario(fn, points: np.ndarray) -> float:
+    start = time.perf_counter()
+    for row in points:
+        fn(row)
+    return (time.perf_counter() - start) / len(points)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenarios", type=int, default=100_000)
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--sample", type=int, default=200)
+    args = parser.parse_args()
+
+    items = parse_grade_book_items(*course_data(args.items))
+    # the upcoming tests, as items of the first test without points
+    test = next(item for item in items if item["measure_type"]["id"] == 0)
+    tests = [
+        dict(test, id=-i, points=None, comment=None, is_for_grade=True, is_hidden=False)
+        for i in range(1, TESTS + 1)
+    ]
+    df = grade_book_items_to_df(items + tests)
+    what_if = WhatIf.from_df(df)
+    ids = [t["id"] for t in tests]
+
+    def loop_df(row: np.ndarray):
+        # the update of calculate_what_if, whose result drops the flattened
+        # columns calculate_score needs
+        updates = [dict(t, points=to_decimal(p)) for t, p in zip(tests, row.tolist())]
+        new_items = grade_book_items_to_df(updates)
+        items_df = df.copy()
+        items_df.loc[new_items.index] = new_items
+        return calculate_score(items_df)
+
+    def loop_what_if(row: np.ndarray):
+        for item_id, p in zip(ids, row.tolist()):
+            what_if.update(item_id, dict(points=p))
+        return what_if.score
+
+    sampled = sample_points([normal(7, 2, 0, 10)] * TESTS, args.scenarios, seed=0)
+    # every combination of points in steps small enough to reach the count
+    steps = round(args.scenarios ** (1 / TESTS))
+    grid = grid_points(np.linspace(0, 10, steps), TESTS)
+
+    sample = sampled[: args.sample]
+    expected = np.array([float(loop_df(row)) for row in sample])
+    assert np.allclose(what_if.scenarios(ids, sample), expected)
+
+    rows = [
+        [
+            "DataFrame loop",
+            len(sample),
+            f"{per_scenario(loop_df, sample) * 1e6:.1f}",
+        ],
+        [
+            "WhatIf.update loop",
+            len(sample),
+            f"{per_scenario(loop_what_if, sample) * 1e6:.1f}",
+        ],
+    ]
+    for name, points in (("sampled", sampled), ("grid", grid)):
+        seconds = best_of(lambda: what_if.scenarios(ids, points))
+        rows.append(
+            [f"scenarios, {name}", len(points), f"{seconds / len(points) * 1e6:.3f}"]
+        )
+
+    def distribution():
+        points = sample_points([normal(7, 2, 0, 10)] * TESTS, args.scenarios)
+        return percentiles(what_if.scenarios(ids, points))
+
+    seconds = best_of(distribution)
+    rows.append(
+        [
+            "sample_points + scenarios + percentiles",
+            args.scenarios,
+            f"{seconds / args.scenarios * 1e6:.3f}",
+        ]
+    )
+    table(["method", "scenarios", "us/scenario"], rows)
+    print(percentiles(what_if.scenarios(ids, sampled)))
+
+
+if __name__ == "__main__":
+    main()
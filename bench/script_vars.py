@@ -0,0 +1,88 @@
+"""
+Extracting JavaScript variables from StudentVUE head scripts of 100 KB to 1 MB,
+with `get_vars` against the bracket matching loop it replaced.
+
+    python -m bench.script_vars [--sizes 100000 300000 1000000]
+"""
+
+import argparse
+import json
+import re
+from typing import Any
+
+from grade.utils import get_var, get_vars
+from .upstream import best_of, head_script, table
+
+NAMES = ("PXP.NavigationData", "PXP.User")
+# variables spread over the whole script, as the translations of a page
+SPREAD = tuple(f"PXP.Translations{i}" for i in range(0, 300, 30))
+
+
+def to_matched(s: str, start: int) -> int:
+    # the character loop of the old extractor, which ignored string literals
+    pairs = {"(": ")", "[": "]", "{": "}"}
+    stack = [s[start]]
+    for i in range(start + 1, len(s)):
+        c = s[i]
+        if c in pairs:
+            stack.append(c)
+        elif c in pairs.values():
+            if pairs[stack.pop()] != c:
+                raise ValueError(f"Unexpected {c}")
+            if not stack:
+                return i
+    raise ValueError("Unexpected EOF")
+
+
+def old_get_var(var_name: str, script: str) -> Any:
+    match = re.search(re.escape(var_name) + r"\s*=\s*", script)
+    if not match:
+        raise ValueError(f"Cannot find {var_name}")
+    end = to_matched(script, match.end())
+    return json.loads(script[match.end() : end + 1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[100_000, 300_000, 1_000_000]
+    )
+    args = parser.parse_args()
+
+    rows = []
+    for size in args.sizes:
+        script = head_script(size)
+        names = NAMES + tuple(n for n in SPREAD if f"{n} =" in script)
+        assert get_vars(script, *names) == {n: old_get_var(n, script) for n in names}
+        rows.append(
+            [
+                f"{len(script) / 1000:.0f}",
+                len(names),
+                *(
+                    f"{t * 1000:.2f}"
+                    for t in (
+                        best_of(lambda: old_get_var(NAMES[0], script)),
+                        best_of(lambda: get_var(NAMES[0], script)),
+                        best_of(lambda: [old_get_var(n, script) for n in names]),
+                        best_of(lambda: get_vars(script, *names)),
+                    )
+                ),
+            ]
+        )
+    table(
+        ["KB", "vars", "old ms", "get_var ms", "old ms (all)", "get_vars ms (all)"],
+        rows,
+    )
+
+    # a closing brace inside a string ends the literal early for the old loop
+    script = 'PXP.NavigationData = {"items": [{"description": "a } b"}]};'
+    try:
+        old_get_var("PXP.NavigationData", script)
+        print("old: ok")
+    except ValueError as e:
+        print(f"old: {type(e).__name__}: {e}")
+    print(f"new: {get_var('PXP.NavigationData', script)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""
+A fake StudentVUE for the benchmarks: synthetic pages and course data in the
+shapes the spider parses, and a local server that answers with a fixed latency.
+"""
+
+import asyncio
+import html
+import json
+import random
+import time
+from collections.abc import Callable
+from typing import Any
+
+from aiohttp import web
+from yarl import URL
+
+import grade.spider.session_manager as session_manager
+import grade.spider.spider as spider
+
+NAVIGATION = [
+    dict(description="Home", url="PXP2_Home.aspx"),
+    dict(description="Grade Book", url="PXP2_GradeBook.aspx"),
+    dict(description="Attendance", url="PXP2_Attendance.aspx"),
+]
+
+
+def course_data(n: int, seed: int = 0) -> tuple[dict, dict]:
+    """
+    Make the class data and items of a course with `n` grade book items.
+
+    Returns:
+        the class data and the items, as the api returns them
+    """
+
+    r = random.Random(seed)
+    measure_types = [
+        dict(id=0, name="Tests", weight=40, dropScore=0),
+        dict(id=1, name="Classwork", weight=60, dropScore=0),
+        dict(id=2, name="Extra", weight=0, dropScore=5),
+    ]
+    comments = [
+        dict(commentCode="LATE", comment="Late", assignmentValue=None, penaltyPct=10),
+        dict(commentCode="EX", comment="Excused", assignmentValue=100),
+    ]
+    assignments, items = [], []
+    for i in range(n):
+        due_date = f"2024-{1 + i % 12:02d}-{1 + i % 28:02d}T00:00:00"
+        assignments.append(
+            dict(
+                gradeBookId=1000 + i,
+                title=f"Assignment {i}",
+                measureTypeId=r.randrange(3),
+                points=r.choice([None, r.randrange(0, 11)]),
+                maxValue=10,
+                score=r.randrange(0, 101),
+                maxScore=100,
+                dueDate=due_date,
+                isForGrading=r.random() < 0.9,
+                hideInPortal=r.random() < 0.05,
+                isGradeBookMissingMark=r.random() < 0.1,
+                commentCode=r.choice([None, "LATE", "EX"]),
+                commentText=r.choice(["", "Good work {see rubric}", None]),
+            )
+        )
+        items.append(dict(itemID=1000 + i, dueDate=due_date))
+    half = n // 2
+    data = [dict(items=items[:half]), dict(items=items[half:])]
+    return (
+        dict(measureTypes=measure_types, comments=comments, assignments=assignments),
+        dict(responseData=dict(data=data)),
+    )
+
+
+def _padding(size: int) -> str:
+    # markup and scripts the spider never looks at, as on the real pages
+    block = (
+        '<div class="widget"><ul>'
+        + "".join(f'<li><a href="#l{i}">Link {i}</a></li>' for i in range(20))
+        + "</ul><script>window.widgets = window.widgets || []; "
+        'window.widgets.push({"name": "w", "items": [1, 2, 3]});</script></div>\n'
+    )
+    return block * max(size // len(block), 0)
+
+
+def head_script(size: int = 0) -> str:
+    """
+    Make the head script of the vue page, padded to about `size` characters with
+    other variables whose strings hold brackets and quotes.
+    """
+
+    filler = []
+    length = 0
+    i = 0
+    while length < size:
+        value = json.dumps(
+            {
+                f"Key{i}_{j}": f'Text with "quotes", {{braces}} and [brackets] {j}'
+                for j in range(50)
+            }
+        )
+        filler.append(f"PXP.Translations{i} = {value};\n")
+        length += len(filler[-1])
+        i += 1
+    navigation = json.dumps(dict(items=NAVIGATION))
+    return (
+        "var PXP = window.PXP || {};\n"
+        + "".join(filler)
+        + f"PXP.NavigationData = {navigation};\n"
+        + 'PXP.User = {"name": "Student"};\n'
+    )
+
+
+def dashboard_page(vue_href: str, padding: int = 0) -> str:
+    return (
+        "<html><head><title>Dashboard</title></head><body>"
+        + _padding(padding // 2)
+        + "<h2>MY eCLASS Apps</h2><ul>"
+        + '<li><a href="apps/mail"><span>Mail</span></a></li>'
+        + f'<li><a href="{vue_href}"><span>My StudentVUE</span></a></li>'
+        + "</ul>"
+        + _padding(padding // 2)
+        + "</body></html>"
+    )
+
+
+def form_page(action: str, padding: int = 0) -> str:
+    return (
+        "<html><head><title>Redirecting</title></head><body>"
+        + f'<form action="{action}" method="post">'
+        + '<input type="hidden" name="SAMLResponse" value="x"/>'
+        + '<input type="hidden" name="RelayState" value="y"/>'
+        + "</form>"
+        + _padding(padding)
+        + "</body></html>"
+    )
+
+
+def vue_page(script_size: int = 0, padding: int = 0) -> str:
+    return (
+        f"<html><head><script>{head_script(script_size)}</script>"
+        + "<title>StudentVUE</title></head><body>"
+        + _padding(padding)
+        + "</body></html>"
+    )
+
+
+def grade_book_page(n_courses: int, padding: int = 0) -> str:
+    """
+    Make the grade book page with one row per course, and unrelated markup around
+    it.
+    """
+
+    rows = []
+    for i in range(n_courses):
+        focus = dict(
+            FocusArgs=dict(classID=5000 + i, markPeriodGU="MP"),
+            LoadParams=dict(ControlName="Gradebook_RichContentClassDetails"),
+        )
+        rows.append(
+            '<div class="row gb-class-header">'
+            f'<div><button data-focus="{html.escape(json.dumps(focus))}">'
+            f"{i + 1}: Course {i}</button></div>"
+            '<div><span class="teacher"><a href="mailto:teacher'
+            f'{i}@school.org">Teacher {i}</a></span></div></div>'
+            '<div class="row gb-class-row">'
+            f'<span class="mark">{"ABCDF"[i % 5]}</span>'
+            f'<span class="score">{90 - i}%</span></div>'
+        )
+    return (
+        "<html><head><title>Grade Book</title></head><body>"
+        + _padding(padding // 4)
+        + '<div id="gradebook-content"><div class="header">Grade Book</div>'
+        + "<div>"
+        + "".join(rows)
+        + "</div></div>"
+        + _padding(padding * 3 // 4)
+        + "</body></html>"
+    )
+
+
+class Upstream:
+    """
+    A local server answering the requests of the spider like StudentVUE, each
+    after `latency` seconds.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        n_courses: int = 6,
+        n_items: int = 80,
+    ):
+        """
+        Args:
+            latency: seconds each request takes
+            n_courses: the number of courses of every user
+            n_items: the number of grade book items of every course
+        """
+
+        self.latency = latency
+        self.n_courses = n_courses
+        self.courses = {5000 + i: course_data(n_items, i) for i in range(n_courses)}
+        self.loaded: dict[str, Any] = {}
+        self.requests = 0
+        self.runner: web.AppRunner | None = None
+        self.url: URL | None = None
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        path = request.path
+        user = request.cookies.get("user", "")
+        if path == "/pkmslogin.form":
+            data = await request.post()
+            response = web.Response(text="Welcome")
+            response.set_cookie("user", str(data["username"]))
+            return response
+        if path == "/dca/student/dashboard":
+            return _html(dashboard_page("vue/link"))
+        if path == "/vue/link":
+            return _html(form_page(str(self.url / "vue" / "submit")))
+        if path == "/vue/submit":
+            raise web.HTTPFound("/vue/PXP2_Start.aspx")
+        if path == "/vue/PXP2_Start.aspx":
+            return _html(vue_page())
+        if path.endswith("/PXP2_GradeBook.aspx"):
+            return _html(grade_book_page(self.n_courses))
+        if path == "/vue/service/PXP2Communication.asmx/LoadControl":
+            data = await request.json()
+            class_id = data["request"]["parameters"]["classID"]
+            # the loaded course is remembered per session, as upstream does
+            self.loaded[user] = class_id
+            return web.json_response(dict(d=dict(Data=dict(html=""))))
+        if path == "/vue/api/GB/ClientSideData/Transfer":
+            class_data, items = self.courses[self.loaded[user]]
+            action = request.query["action"]
+            return web.json_response(class_data if "classdata" in action else items)
+        raise web.HTTPNotFound()
+
+    async def start(self) -> URL:
+        app = web.Application()
+        app.router.add_route("*", "/{tail:.*}", self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = URL(f"http://127.0.0.1:{port}/")
+        use(self.url)
+        return self.url
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+
+def _html(text: str) -> web.Response:
+    return web.Response(text=text, content_type="text/html")
+
+
+def use(url: URL):
+    """
+    Point the spider at another upstream than StudentVUE.
+    """
+
+    spider.DASHBOARD_URL = url
+    session_manager.DASHBOARD_URL = url
+
+
+def best_of(fn: Callable[[], Any], repeat: int = 5, number: int = 1) -> float:
+    """
+    Time a function, in seconds per call, as the best of `repeat` runs.
+    """
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append((time.perf_counter() - start) / number)
+    return min(times)
+
+
+def table(header: list[str], rows: list[list[Any]]):
+    """
+    Print rows as a plain text table.
+    """
+
+    rows = [[str(v) for v in row] for row in [header, *rows]]
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+    for row in rows:
+        print("  ".join(v.rjust(w) for v, w in zip(row, widths)))
@@ -1,12 +1,28 @@
+import hashlib
 import itertools as it
-from typing import get_type_hints
+import math
+from collections import OrderedDict
+from decimal import ROUND_HALF_UP
+from typing import Any, Literal, TypedDict, get_type_hints
 
 import pandas as pd
-from pandas import DataFrame
 
 from grade.spider.model import *
-from grade.utils import to_decimal
-from grade.utils.df import explode, condense
+from grade.utils import DISPLAY_QUANTUM, to_decimal
+from grade.utils.df import df_to_records, records_to_df
+
+Backend = Literal["decimal", "float"]
+
+NUMERIC_COLUMNS = [
+    "points",
+    "max_points",
+    "score",
+    "max_score",
+    "comment_assignment_value",
+    "comment_penalty_percent",
+    "measure_type_weight",
+    "measure_type_drop_score",
+]
 
 
 def grade_book_items_to_df(grade_book_items: list[GradeBookItem]) -> pd.DataFrame:
@@ -20,10 +36,9 @@ def grade_book_items_to_df(grade_book_items: list[GradeBookItem]) -> pd.DataFram
         the DataFrame
     """
 
-    df = DataFrame(grade_book_items)
-    df = explode(df, "comment", Comment)
-    df = explode(df, "measure_type", MeasureType)
-    return df.set_index("id")
+    return records_to_df(
+        grade_book_items, index="id", comment=Comment, measure_type=MeasureType
+    )
 
 
 def df_to_grade_book_items(df: pd.DataFrame) -> list[GradeBookItem]:
@@ -37,9 +52,67 @@ def df_to_grade_book_items(df: pd.DataFrame) -> list[GradeBookItem]:
         the grade book items
     """
 
-    df = condense(df, "comment", Comment)
-    df = condense(df, "measure_type", MeasureType)
-    return df.to_dict(orient="records")
+    return df_to_records(df, comment=Comment, measure_type=MeasureType)
+
+
+def to_backend(grade_book_items: pd.DataFrame, backend: Backend) -> pd.DataFrame:
+    """
+    Convert the numeric columns of the grade book items for a numeric backend.
+
+    The "decimal" backend keeps exact `Decimal` objects, so every operation runs in
+    Python. The "float" backend uses float64 columns, so operations run in NumPy;
+    its results should be passed through `to_display` before they are shown.
+
+    Args:
+        grade_book_items: the grade book items
+        backend: the numeric backend
+
+    Returns:
+        the converted DataFrame
+    """
+
+    columns = [c for c in NUMERIC_COLUMNS if c in grade_book_items.columns]
+    if backend == "float":
+        return grade_book_items.astype({c: "float64" for c in columns})
+    if backend == "decimal":
+        return grade_book_items.assign(
+            **{
+                c: [to_decimal(v) for v in grade_book_items[c].tolist()]
+                for c in columns
+                if grade_book_items[c].dtype != object
+            }
+        )
+    raise ValueError(f"Unknown backend {backend}")
+
+
+def _constant(grade_book_items: pd.DataFrame, v: int) -> Decimal | float:
+    return to_decimal(v) if grade_book_items["max_score"].dtype == object else float(v)
+
+
+def to_display(v: Any) -> Any:
+    """
+    Convert the results of either backend to `Decimal` at the displayed precision.
+
+    Float results are first rounded to 9 places, so float error just below a
+    rounding boundary does not flip the last displayed digit.
+
+    Args:
+        v: a number, or a dict or list of numbers
+
+    Returns:
+        the converted result, of the same shape
+    """
+
+    if isinstance(v, dict):
+        return {k: to_display(x) for k, x in v.items()}
+    if isinstance(v, list):
+        return [to_display(x) for x in v]
+    if isinstance(v, float):
+        v = f"{v:.9f}" if math.isfinite(v) else v
+    v = to_decimal(v)
+    if not v.is_finite():
+        return v
+    return v.quantize(DISPLAY_QUANTUM, rounding=ROUND_HALF_UP)
 
 
 def _calculate_adjusted_score(
@@ -51,26 +124,107 @@ def _calculate_adjusted_score(
     """
     df = grade_book_items
     df = df[df["is_for_grade"] & ~df["is_hidden"]]
-    df.loc[df["is_missing"], "points"] = to_decimal(0)
-    points = df["comment_assignment_value"].fillna(df["points"]).fillna(to_decimal(0))
+    zero, hundred = _constant(df, 0), _constant(df, 100)
+    points = df["points"].mask(df["is_missing"], zero)
+    points = df["comment_assignment_value"].fillna(points).fillna(zero)
     score = points / df["max_points"] * df["max_score"]
-    score = score * (
-        1 - (df["comment_penalty_percent"] / to_decimal(100)).fillna(to_decimal(0))
-    )
-    score = score - df["measure_type_drop_score"].fillna(to_decimal(0))
+    score = score * (1 - (df["comment_penalty_percent"] / hundred).fillna(zero))
+    score = score - df["measure_type_drop_score"].fillna(zero)
     score = score.clip(upper=df["max_score"])
 
     if inplace:
-        df["adjusted_score"] = score
+        grade_book_items["adjusted_score"] = score
     else:
         return score
 
 
-def _ensure_adjusted_score(grade_book_items: pd.DataFrame) -> pd.DataFrame:
-    if "adjusted_score" not in grade_book_items.columns:
-        grade_book_items = grade_book_items.copy()
-        _calculate_adjusted_score(grade_book_items, inplace=True)
-    return grade_book_items
+class GradeReport(TypedDict):
+    """
+    The analysis of the grade book items of a course.
+    """
+
+    score: Decimal
+    score_by_measure_type: dict[MeasureType["id"], Decimal]
+    blame: dict[GradeBookItem["id"], Decimal]
+    contrib: dict[GradeBookItem["id"], Decimal]
+
+
+_reports: OrderedDict[str, GradeReport] = OrderedDict()
+REPORT_CACHE_SIZE = 128
+
+
+def content_hash(df: pd.DataFrame) -> str:
+    """
+    Hash the content of a DataFrame, including its index and column names.
+    """
+
+    h = hashlib.blake2b(digest_size=16)
+    h.update("\0".join(map(str, df.columns)).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def calculate_report(grade_book_items: pd.DataFrame) -> GradeReport:
+    """
+    Calculate the score, the score of each measure type, the blame and the
+    contribution of the grade book items at once.
+
+    The items are filtered and grouped by measure type once, and every per-item
+    value is computed with vectorized operations. Reports are cached by the content
+    hash of the items.
+    """
+
+    key = content_hash(grade_book_items)
+    if key in _reports:
+        _reports.move_to_end(key)
+        return _reports[key]
+
+    df = grade_book_items
+    zero, one, hundred = (_constant(df, v) for v in (0, 1, 100))
+    # every item carries the weight of its measure type, which counts once
+    weights = df.groupby("measure_type_id")["measure_type_weight"].first()
+
+    if "adjusted_score" in df.columns:
+        adjusted_score = df["adjusted_score"].dropna()
+    else:
+        adjusted_score = _calculate_adjusted_score(df)
+    groups = adjusted_score.groupby(df["measure_type_id"])
+    counts = groups.count()
+    counts = counts[counts > 0]
+    means = groups.sum()[counts.index] / counts
+    # measure types without counted items, e.g. a final not graded yet, have no
+    # score to weight, so only the others share the final score
+    total_weight = weights.loc[means.index].sum()
+    score = (means * weights.loc[means.index] / total_weight).sum()
+
+    mt = df.loc[adjusted_score.index, "measure_type_id"]
+    contrib = (
+        adjusted_score
+        * df.loc[adjusted_score.index, "measure_type_weight"]
+        / total_weight
+        / mt.map(counts)
+    )
+
+    bdf = df[~(df["is_hidden"] | df["is_missing"] | ~df["is_for_grade"])]
+    bdf = bdf[bdf["measure_type_id"].isin(means.index)]
+    blame = (
+        (one - bdf["comment_penalty_percent"].fillna(zero) / hundred)
+        / bdf["measure_type_id"].map(bdf["measure_type_id"].value_counts())
+        * (bdf["measure_type_weight"] / total_weight)
+        - bdf["measure_type_drop_score"].fillna(zero)
+        / bdf["max_score"].fillna(hundred)
+    )
+
+    report = GradeReport(
+        score=score,
+        score_by_measure_type=means.to_dict(),
+        blame=blame.to_dict(),
+        contrib=contrib.to_dict(),
+    )
+    _reports[key] = report
+    if len(_reports) > REPORT_CACHE_SIZE:
+        _reports.popitem(last=False)
+    return report
 
 
 def calculate_score(grade_book_items: pd.DataFrame) -> Decimal:
@@ -78,11 +232,7 @@ def calculate_score(grade_book_items: pd.DataFrame) -> Decimal:
     Calculate the final score of the grade book items.
     """
 
-    grade_book_items = _ensure_adjusted_score(grade_book_items)
-    df = grade_book_items.groupby("measure_type_id")
-    means = df["adjusted_score"].sum() / df["adjusted_score"].count()
-    weights = df["measure_type_weight"].sum()
-    return ((means * weights) / weights.sum()).sum()
+    return calculate_report(grade_book_items)["score"]
 
 
 def calculate_score_by_measure_type(
@@ -92,10 +242,7 @@ def calculate_score_by_measure_type(
     Calculate the score of each measure type.
     """
 
-    grade_book_items = _ensure_adjusted_score(grade_book_items)
-    df = grade_book_items.groupby("measure_type_id")
-    means = df["adjusted_score"].sum() / df["adjusted_score"].count()
-    return means.to_dict()
+    return calculate_report(grade_book_items)["score_by_measure_type"]
 
 
 def calculate_blame(
@@ -109,46 +256,7 @@ def calculate_blame(
     impact on the final score. All blame values sum up to 1.
     """
 
-    total_weight = grade_book_items.drop_duplicates(
-        "measure_type_id"
-    ).measure_type_weight.sum()
-    bdf = grade_book_items[
-        [
-            "id",
-            "is_missing",
-            "is_hidden",
-            "is_for_grade",
-            "max_score",
-            "measure_type_weight",
-            "measure_type_id",
-            "measure_type_drop_score",
-            "comment_penalty_percent",
-        ]
-    ].set_index("id")
-    return (
-        bdf.assign(blame=to_decimal(1))
-        .pipe(
-            lambda df: df[~(df["is_hidden"] | df["is_missing"] | ~df["is_for_grade"])]
-        )
-        .assign(
-            blame=lambda df: df["blame"]
-                             * (1 - df["comment_penalty_percent"].fillna(to_decimal(0)) / 100)
-        )
-        .groupby("measure_type_id", group_keys=False)
-        .apply(
-            lambda g: g.assign(
-                blame=g["blame"]
-                      / g["blame"].count()
-                      * (g["measure_type_weight"] / total_weight)
-            )
-        )
-        .assign(
-            blame=lambda df: df["blame"]
-                             - df["measure_type_drop_score"].fillna(to_decimal(0))
-                             / df["max_score"].fillna(to_decimal(100))
-        )["blame"]
-        .to_dict()
-    )
+    return calculate_report(grade_book_items)["blame"]
 
 
 def calculate_contrib(
@@ -162,22 +270,7 @@ def calculate_contrib(
     contributed the maximum possible score to the final score.
     """
 
-    grade_book_items = _ensure_adjusted_score(grade_book_items)
-    total_weight = grade_book_items.drop_duplicates(
-        "measure_type_id"
-    ).measure_type_weight.sum()
-    return (
-        grade_book_items.groupby("measure_type_id", group_keys=False)
-        .apply(lambda g: g.assign(count=g["adjusted_score"].count()))
-        .apply(
-            lambda g: g.adjusted_score
-                      * g.measure_type_weight
-                      / total_weight
-                      / g["count"],
-            axis=1,
-        )
-        .to_dict()
-    )
+    return calculate_report(grade_book_items)["contrib"]
 
 
 def calculate_what_if(
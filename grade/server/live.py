@@ -0,0 +1,227 @@
+import asyncio
+import contextlib
+from typing import Any
+
+from grade.spider import (
+    GradeBook,
+    LoginFailedException,
+    SpiderIOException,
+    get_courses,
+    iter_grade_book_items,
+)
+from grade.utils import LOGGER
+from .serialize import dumps, json_dates, json_number
+
+# seconds between two refreshes of the data of a user
+REFRESH_INTERVAL = 60
+# seconds between two heartbeats to a subscriber
+HEARTBEAT_INTERVAL = 15
+# events a subscriber may fall behind before it is sent a snapshot instead
+QUEUE_SIZE = 16
+
+RESYNC = ("resync", b"")
+
+
+class Feed:
+    """
+    The live data of one user, refreshed by one loop shared by all subscribers.
+
+    Each refresh is compared with the previous one, and only the changed courses
+    and grade book items are published. A subscriber that falls too far behind is
+    sent a full snapshot instead of the events it missed.
+    """
+
+    def __init__(self, username: str, password: str, interval: float):
+        self.username = username
+        self.password = password
+        self.interval = interval
+        self.subscribers: set[asyncio.Queue[tuple[str, bytes]]] = set()
+        self.courses: dict[Any, dict] = {}
+        self.books: dict[Any, GradeBook] = {}
+        self.items: dict[Any, dict[Any, dict]] = {}
+        self.ready = asyncio.Event()
+        self.task: asyncio.Task | None = None
+
+    def snapshot(self) -> bytes:
+        return dumps(
+            dict(
+                courses=list(self.courses.values()),
+                items={k: list(v.values()) for k, v in self.items.items()},
+            )
+        )
+
+    def publish(self, event: str, data: bytes):
+        for queue in self.subscribers:
+            try:
+                queue.put_nowait((event, data))
+            except asyncio.QueueFull:
+                # the subscriber is too slow, so skip what it missed
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RESYNC)
+
+    async def refresh(self) -> dict[str, Any] | None:
+        """
+        Fetch the data of the user again and apply it.
+
+        Returns:
+            the changes since the previous refresh, or None if there are none
+        """
+
+        courses = {
+            c["id"]: c
+            for c in await get_courses(self.username, self.password, force=True)
+        }
+        books = dict(self.books)
+        async for course_id, result in iter_grade_book_items(
+            self.username, self.password, list(courses)
+        ):
+            if isinstance(result, GradeBook):
+                books[course_id] = result
+            elif not isinstance(result, LookupError):
+                raise result
+
+        diff = dict(
+            courses=[c for k, c in courses.items() if self.courses.get(k) != c],
+            removed_courses=[k for k in self.courses if k not in courses],
+            items={},
+            removed_items={},
+        )
+        for course_id in courses:
+            book = books.get(course_id)
+            if book is None or book is self.books.get(course_id):
+                continue
+            # float records, so NaN compares equal to itself as None
+            items = {r["id"]: r for r in book.to_records(json_number, json_dates)}
+            old = self.items.get(course_id, {})
+            changed = [r for k, r in items.items() if old.get(k) != r]
+            removed = [k for k in old if k not in items]
+            if changed:
+                diff["items"][course_id] = changed
+            if removed:
+                diff["removed_items"][course_id] = removed
+            self.items[course_id] = items
+
+        for course_id in diff["removed_courses"]:
+            books.pop(course_id, None)
+            self.items.pop(course_id, None)
+        self.courses = courses
+        self.books = {k: v for k, v in books.items() if k in courses}
+        self.ready.set()
+        return diff if any(diff.values()) else None
+
+    async def run(self):
+        while True:
+            # the first refresh reaches subscribers as their snapshot
+            first = not self.ready.is_set()
+            try:
+                diff = await self.refresh()
+            except LoginFailedException:
+                error = dict(error="Invalid username or password")
+                self.publish("error", dumps(error))
+                return
+            except (SpiderIOException, OSError, asyncio.TimeoutError):
+                self.publish("error", dumps(dict(error="Spider failed to scrape")))
+            except Exception as e:
+                # keep the feed alive, as the next refresh may well succeed
+                LOGGER.exception("Failed to refresh the live data of %s", self.username)
+                self.publish("error", dumps(dict(error=str(e))))
+            else:
+                if diff is not None and not first:
+                    self.publish("diff", dumps(diff))
+            await asyncio.sleep(self.interval)
+
+
+class Hub:
+    """
+    The live feeds of all users with subscribers.
+    """
+
+    def __init__(
+        self,
+        interval: float = REFRESH_INTERVAL,
+        heartbeat: float = HEARTBEAT_INTERVAL,
+        queue_size: int = QUEUE_SIZE,
+    ):
+        """
+        Args:
+            interval: seconds between two refreshes of the data of a user
+            heartbeat: seconds between two heartbeats to a subscriber
+            queue_size: events a subscriber may fall behind before it is sent a
+                snapshot instead
+        """
+
+        self.interval = interval
+        self.heartbeat = heartbeat
+        self.queue_size = queue_size
+        self.feeds: dict[str, Feed] = {}
+
+    def subscribe(
+        self, username: str, password: str
+    ) -> tuple[Feed, asyncio.Queue[tuple[str, bytes]]]:
+        """
+        Subscribe to the data of a user, starting its refresh loop if needed.
+
+        Returns:
+            the feed, and the queue of its events for the subscriber
+        """
+
+        session_key = f"{username}:{password}"
+        feed = self.feeds.get(session_key)
+        if feed is None or feed.task is None or feed.task.done():
+            feed = self.feeds[session_key] = Feed(username, password, self.interval)
+            feed.task = asyncio.create_task(feed.run())
+        queue = asyncio.Queue(self.queue_size)
+        feed.subscribers.add(queue)
+        return feed, queue
+
+    def unsubscribe(self, feed: Feed, queue: asyncio.Queue[tuple[str, bytes]]):
+        """
+        Unsubscribe from a feed, stopping its refresh loop if it was the last
+        subscriber.
+        """
+
+        feed.subscribers.discard(queue)
+        if not feed.subscribers:
+            feed.task.cancel()
+            session_key = f"{feed.username}:{feed.password}"
+            if self.feeds.get(session_key) is feed:
+                del self.feeds[session_key]
+
+    async def events(self, username: str, password: str):
+        """
+        Iterate over the events for one subscriber: a snapshot first, then
+        changes, with a heartbeat of None whenever there is nothing to send.
+
+        Returns:
+            the event name and data, or None for a heartbeat
+        """
+
+        feed, queue = self.subscribe(username, password)
+        try:
+            while not feed.ready.is_set():
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(feed.ready.wait(), self.heartbeat)
+                if feed.task.done():
+                    break
+                if not feed.ready.is_set():
+                    yield None
+            if feed.ready.is_set():
+                yield "snapshot", feed.snapshot()
+            while not feed.task.done() or not queue.empty():
+                try:
+                    event = await asyncio.wait_for(queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                yield ("snapshot", feed.snapshot()) if event is RESYNC else event
+        finally:
+            self.unsubscribe(feed, queue)
+
+    async def cleanup(self):
+        for feed in list(self.feeds.values()):
+            feed.task.cancel()
+        self.feeds.clear()
+
+
+hub = Hub()
@@ -0,0 +1,176 @@
+import gzip
+import hashlib
+from collections import OrderedDict
+from typing import Any
+from weakref import WeakKeyDictionary
+
+from aiohttp import web
+from aiohttp.web_request import Request
+
+from grade.spider import GradeBook
+from .serialize import dumps
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+BODY_CACHE_SIZE = 256
+# bodies smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 1024
+
+
+class Body:
+    """
+    An encoded JSON body, with its content hash and the compressed forms served so
+    far.
+    """
+
+    __slots__ = ("data", "digest", "encodings")
+
+    def __init__(self, data: bytes, digest: str | None = None):
+        self.data = data
+        self.digest = digest or hashlib.blake2b(data, digest_size=16).hexdigest()
+        self.encodings: dict[str, bytes] = {}
+
+    def etag(self, coding: str = "identity") -> str:
+        """
+        Get the strong ETag of the body sent with a content coding; each coding
+        has its own, as the bytes sent differ.
+        """
+
+        if coding == "identity":
+            return f'"{self.digest}"'
+        return f'"{self.digest}-{coding}"'
+
+    def encode(self, coding: str) -> bytes:
+        """
+        Get the body compressed with a content coding, compressing it only once.
+        """
+
+        if coding == "identity":
+            return self.data
+        if coding not in self.encodings:
+            if coding == "br":
+                self.encodings[coding] = brotli.compress(self.data, quality=5)
+            elif coding == "gzip":
+                self.encodings[coding] = gzip.compress(self.data, compresslevel=6)
+            else:
+                raise ValueError(f"Unknown content coding {coding}")
+        return self.encodings[coding]
+
+
+# bodies of cached spider results, dropped together with the results
+results: WeakKeyDictionary[GradeBook, Body] = WeakKeyDictionary()
+# other bodies by content hash, so unchanged results keep their compressed forms
+bodies: OrderedDict[str, Body] = OrderedDict()
+
+
+def body_of(v: Any) -> Body:
+    """
+    Get the encoded body of a value, reusing the body of a cached result or of an
+    equal earlier value.
+    """
+
+    if isinstance(v, GradeBook):
+        body = results.get(v)
+        if body is None:
+            body = results[v] = Body(dumps(v))
+        return body
+
+    data = dumps(v)
+    digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+    body = bodies.get(digest)
+    if body is None:
+        body = bodies[digest] = Body(data, digest)
+        if len(bodies) > BODY_CACHE_SIZE:
+            bodies.popitem(last=False)
+    else:
+        bodies.move_to_end(digest)
+    return body
+
+
+def _codings(accept_encoding: str) -> dict[str, float]:
+    codings = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding:
+            codings[coding.strip().lower()] = q
+    return codings
+
+
+def negotiate(request: Request, body: Body) -> str:
+    """
+    Pick the content coding of a response from the Accept-Encoding of a request.
+
+    Args:
+        request: the request
+        body: the body to send
+
+    Returns:
+        "br" or "gzip" if accepted and worth it, otherwise "identity"
+    """
+
+    if len(body.data) < MIN_COMPRESS_SIZE:
+        return "identity"
+    codings = _codings(request.headers.get("Accept-Encoding", ""))
+    available = ["br", "gzip"] if brotli is not None else ["gzip"]
+    q = {c: codings.get(c, codings.get("*", 0.0)) for c in available}
+    best = max(available, key=lambda c: q[c])
+    return best if q[best] > 0 else "identity"
+
+
+def not_modified(request: Request, body: Body) -> bool:
+    """
+    Check whether the If-None-Match of a request matches the ETag of a body.
+    """
+
+    if_none_match = request.headers.get("If-None-Match")
+    if not if_none_match:
+        return False
+    tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+    return "*" in tags or any(
+        body.etag(coding) in tags for coding in ("identity", "gzip", "br")
+    )
+
+
+def conditional_response(request: Request, v: Any) -> web.Response:
+    """
+    Respond with a value as JSON, or with 304 Not Modified if the client has it.
+
+    The response carries a strong ETag of the encoded body, and is compressed as
+    negotiated from a cached compressed form. A client holding any coding of the
+    same body gets 304.
+
+    Args:
+        request: the request
+        v: the value
+
+    Returns:
+        the response
+    """
+
+    body = body_of(v)
+    coding = negotiate(request, body)
+    headers = {
+        "ETag": body.etag(coding),
+        "Vary": "Accept-Encoding",
+        "Cache-Control": "private, no-cache",
+    }
+    if not_modified(request, body):
+        return web.Response(status=304, headers=headers)
+    if coding != "identity":
+        headers["Content-Encoding"] = coding
+    return web.Response(
+        body=body.encode(coding),
+        content_type="application/json",
+        headers=headers,
+    )
@@ -0,0 +1,116 @@
+import datetime
+import json
+import math
+from collections.abc import Mapping
+from decimal import Decimal
+from typing import Any
+from weakref import WeakKeyDictionary
+
+import numpy as np
+import pandas as pd
+
+from grade.spider import GradeBook
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# encoded bodies of cached spider results, dropped together with the results
+encoded: WeakKeyDictionary[GradeBook, bytes] = WeakKeyDictionary()
+
+
+def json_number(d: Decimal | float | None) -> float | None:
+    if d is None:
+        return None
+    f = float(d)
+    return f if math.isfinite(f) else None
+
+
+def json_dates(dates: np.ndarray) -> list[str | None]:
+    whole = np.isnat(dates) | (dates.astype("datetime64[s]") == dates)
+    unit = "s" if whole.all() else "us"
+    return [
+        None if s == "NaT" else s
+        for s in np.datetime_as_string(dates, unit=unit).tolist()
+    ]
+
+
+def to_builtin(o: Any) -> Any:
+    """
+    Convert an object the JSON backend cannot encode into one it can.
+
+    `Decimal` NaN and NaT become null. Grade books are converted by column, so each
+    distinct number is converted once.
+    """
+
+    if isinstance(o, Decimal):
+        return json_number(o)
+    if isinstance(o, GradeBook):
+        return o.to_records(json_number, json_dates)
+    if o is pd.NaT:
+        return None
+    if isinstance(o, datetime.datetime):
+        return o.isoformat()
+    if isinstance(o, pd.DataFrame):
+        return o.to_dict(orient="records")
+    if isinstance(o, pd.Series):
+        return o.to_dict()
+    if isinstance(o, Mapping):
+        return dict(o)
+    if isinstance(o, (np.generic, np.ndarray)):
+        return o.tolist()
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def _finite(v: Any) -> Any:
+    """
+    Replace the NaN and infinite floats in a value by None, as orjson writes them.
+    """
+
+    if isinstance(v, float):
+        return v if math.isfinite(v) else None
+    if isinstance(v, dict):
+        return {k: _finite(x) for k, x in v.items()}
+    if isinstance(v, (list, tuple)):
+        return [_finite(x) for x in v]
+    return v
+
+
+def _dumps(v: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(
+            v,
+            default=to_builtin,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+        )
+    return json.dumps(
+        _finite(v),
+        default=lambda o: _finite(to_builtin(o)),
+        separators=(",", ":"),
+        allow_nan=False,
+    ).encode("utf-8")
+
+
+def dumps(v: Any) -> bytes:
+    """
+    Encode a value as JSON bytes, with orjson if it is installed.
+
+    The encoded body of a cached `GradeBook` is kept as long as the grade book is,
+    so repeated responses are not encoded again. Float NaN and infinity, which
+    only the float analysis backend produces, are written as null by either
+    backend, so the output is always valid JSON.
+
+    Args:
+        v: the value
+
+    Returns:
+        the JSON bytes
+    """
+
+    if isinstance(v, GradeBook):
+        body = encoded.get(v)
+        if body is None:
+            body = encoded[v] = _dumps(v)
+        return body
+    return _dumps(v)
@@ -1,17 +1,40 @@
 import asyncio
+import json
 import threading
+from decimal import Decimal
+from pathlib import Path
 
 from aiohttp import web
 from aiohttp.web import Request, Response, RouteTableDef
 
-from grade.spider import get_courses, get_course, get_grade_book_items, manager
-from .utils import extract_auth, catch_common_exceptions, extract_course, json_response
+from grade.spider import (
+    get_courses,
+    get_course,
+    get_grade_book_items,
+    iter_grade_book_items,
+    manager,
+    SessionStore,
+)
+from .utils import (
+    ADMIN_TOKEN,
+    extract_auth,
+    catch_common_exceptions,
+    check_admin,
+    extract_course,
+    extract_force,
+    json_response,
+    ndjson_line,
+    with_deadline,
+)
+from .live import hub
+from .what_if import WhatIf
 
 routes = RouteTableDef()
 
 
 @routes.get("/courses")
 @catch_common_exceptions
+@with_deadline
 async def handle_courses(request: Request) -> Response:
     """
     Get all courses from the database
@@ -24,12 +47,13 @@ async def handle_courses(request: Request) -> Response:
     """
 
     username, password = extract_auth(request)
-    courses = await get_courses(username, password)
-    return json_response(courses)
+    courses = await get_courses(username, password, extract_force(request))
+    return json_response(courses, request)
 
 
 @routes.get("/course/data")
 @catch_common_exceptions
+@with_deadline
 async def handle_course_data(request: Request) -> Response:
     """
     Get a course data from the database
@@ -51,12 +75,13 @@ async def handle_course_data(request: Request) -> Response:
     except (TypeError, ValueError):
         course_index = -1
     course = await get_course(username, password, course_id=course_id, course_name=course_name,
-                              course_index=course_index)
-    return json_response(course)
+                              course_index=course_index, force=extract_force(request))
+    return json_response(course, request)
 
 
 @routes.get("/course/grade_book_items")
 @catch_common_exceptions
+@with_deadline
 async def handle_grade_book_items(request: Request) -> Response:
     """
     Get a course data from the database
@@ -71,23 +96,226 @@ async def handle_grade_book_items(request: Request) -> Response:
     username, password = extract_auth(request)
     course_id, course_index, course_name = await extract_course(request)
     grade_book_items = await get_grade_book_items(username, password, course_id=course_id,
-                                                  course_name=course_name, course_index=course_index)
-    return json_response(grade_book_items)
+                                                  course_name=course_name, course_index=course_index,
+                                                  force=extract_force(request))
+    return json_response(grade_book_items, request)
 
 
-def run(event: asyncio.Event | threading.Event, port: int = 65535):
+@routes.get("/courses/grade_book_items")
+@catch_common_exceptions
+@with_deadline
+async def handle_courses_grade_book_items(request: Request) -> web.StreamResponse:
+    """
+    Stream the grade book items of several courses as NDJSON, one line per course
+    as soon as it is fetched
+
+    Args:
+        request: a request object with the username and password, and `ids` in
+            query, a comma separated list of integer course ids or "all" (the
+            default)
+
+    Returns:
+        a streamed response with a line {"id", "items"} or {"id", "error"} per
+        course
+    """
+
+    username, password = extract_auth(request)
+    ids = request.rel_url.query.get("ids", "all")
+    try:
+        # course ids are integers, so every line carries its id as one
+        course_ids = None if ids == "all" else [int(i) for i in ids.split(",") if i]
+    except ValueError:
+        raise web.HTTPBadRequest(reason=f"Invalid course ids: {ids}")
+    lines = iter_grade_book_items(
+        username, password, course_ids, extract_force(request)
+    )
+    try:
+        # surface login and course listing failures before the response starts
+        first_line = await anext(lines, None)
+        response = web.StreamResponse(
+            headers={
+                "Content-Type": "application/x-ndjson",
+                "Cache-Control": "no-store",
+            }
+        )
+        await response.prepare(request)
+        if first_line is not None:
+            await response.write(ndjson_line(*first_line))
+            async for line in lines:
+                await response.write(ndjson_line(*line))
+        await response.write_eof()
+        return response
+    finally:
+        await lines.aclose()
+
+
+@routes.get("/live")
+@catch_common_exceptions
+async def handle_live(request: Request) -> web.StreamResponse:
+    """
+    Push the changes of the courses and grade book items of a user as server-sent
+    events, from one refresh loop shared by all subscribers of the user
+
+    Args:
+        request: a request object with the username and password
+
+    Returns:
+        a streamed response with a `snapshot` event first, then `diff` and `error`
+        events, and heartbeat comments in between
+    """
+
+    username, password = extract_auth(request)
+    response = web.StreamResponse(
+        headers={
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-store",
+            "X-Accel-Buffering": "no",
+        }
+    )
+    await response.prepare(request)
+    events = hub.events(username, password)
+    try:
+        async for event in events:
+            if event is None:
+                await response.write(b": heartbeat\n\n")
+            else:
+                name, data = event
+                await response.write(
+                    b"event: %s\ndata: %s\n\n" % (name.encode(), data)
+                )
+    except ConnectionResetError:
+        pass
+    finally:
+        await events.aclose()
+    return response
+
+
+@routes.post("/course/what_if")
+@catch_common_exceptions
+@with_deadline
+async def handle_what_if(request: Request) -> Response:
+    """
+    Get the score of a course with hypothetical grade book items
+
+    Args:
+        request: a request object with the username and password, and a body with
+            a list of partial grade book items; items with a known id are updated,
+            the others are added
+
+    Returns:
+        a response object with the score, the score of each measure type and the
+        adjusted score of each given item
+    """
+
+    username, password = extract_auth(request)
+    try:
+        changes = await request.json(loads=lambda s: json.loads(s, parse_float=Decimal))
+    except ValueError:
+        raise web.HTTPBadRequest(reason="Invalid JSON body")
+    if not isinstance(changes, list) or not all(
+        isinstance(c, dict) and "id" in c for c in changes
+    ):
+        raise web.HTTPBadRequest(reason="Body must be a list of items with an id")
+    course_id, course_index, course_name = await extract_course(request)
+    grade_book_items = await get_grade_book_items(username, password, course_id=course_id,
+                                                  course_name=course_name, course_index=course_index,
+                                                  force=extract_force(request))
+    what_if = WhatIf.from_grade_book_items(grade_book_items)
+    try:
+        for change in changes:
+            if change["id"] in what_if.items:
+                what_if.update(change["id"], change)
+            else:
+                what_if.add(change["id"], change)
+    except ValueError as e:
+        raise web.HTTPBadRequest(reason=str(e))
+    return json_response(what_if.result(), request)
+
+
+@routes.get("/courses/score_needed")
+@catch_common_exceptions
+@with_deadline
+async def handle_score_needed(request: Request) -> Response:
+    """
+    Get the scores needed on the ungraded items of every course to reach a target
+
+    Args:
+        request: a request object with the username and password, and `target`,
+            and optionally `high` and `others`, in query
+
+    Returns:
+        a response object with the scores needed by course id
+    """
+
+    username, password = extract_auth(request)
+    query = request.rel_url.query
+    try:
+        target = float(query["target"])
+        high = float(query.get("high", 100))
+        others = float(query.get("others", 0))
+    except (KeyError, ValueError):
+        raise web.HTTPBadRequest(reason="Missing or invalid target")
+    # the courses are listed, and the grade book page refreshed, only once
+    score_needed = {}
+    lines = iter_grade_book_items(username, password, force=extract_force(request))
+    try:
+        async for course_id, result in lines:
+            if isinstance(result, Exception):
+                raise result
+            score_needed[course_id] = WhatIf.from_grade_book_items(
+                result
+            ).score_needed(target, high=high, others=others)
+    finally:
+        await lines.aclose()
+    # in a stable order, so the ETag does not depend on which course came first
+    return json_response(
+        dict(sorted(score_needed.items(), key=lambda kv: str(kv[0]))), request
+    )
+
+
+@routes.get("/admin/sessions")
+async def handle_admin_sessions(request: Request) -> Response:
+    """
+    Get the memory held by each live session and the connection pool usage
+
+    Args:
+        request: a request object with the admin token
+
+    Returns:
+        a response object with the session and pool stats
+    """
+
+    check_admin(request)
+    return json_response(
+        dict(sessions=manager.memory_stats(), pool=manager.pool_stats()), request
+    )
+
+
+def run(
+    event: asyncio.Event | threading.Event,
+    port: int = 65535,
+    session_store: str | Path | None = None,
+    admin_token: str | None = None,
+):
     """
     Run the server
 
     Args:
         event: the event to check for shutdown
         port: the port to run the server on
+        session_store: a directory to keep sessions in across restarts, if any
+        admin_token: the token required by the admin routes, which are disabled
+            without one
 
     Returns:
         None
     """
 
+    if session_store is not None:
+        manager.store = SessionStore(session_store)
+
     app = web.Application()
+    app[ADMIN_TOKEN] = admin_token or ""
 
     async def bootstrap(this_app: web.Application) -> None:
         async def check_for_shutdown() -> None:
@@ -97,12 +325,14 @@ def run(event: asyncio.Event | threading.Event, port: int = 65535):
                     await this_app.shutdown()
 
         asyncio.create_task(check_for_shutdown())
+        manager.start()
 
     async def cleanup(_: web.Application) -> None:
+        await hub.cleanup()
         await manager.cleanup()
 
     app.on_startup.append(bootstrap)
     app.on_shutdown.append(cleanup)
     app.add_routes(routes)
 
-    web.run_app(app, port=port)
+    web.run_app(app, port=port, handler_cancellation=True)
@@ -1,16 +1,22 @@
-import json
-from decimal import Decimal
+import asyncio
+import hmac
 from typing import Callable, ParamSpec, TypeVar, Any
 
-import pandas as pd
 from aiohttp import web
 from aiohttp.web_request import Request
 
 from grade.spider import LoginFailedException, SpiderIOException
+from .response import conditional_response
+from .serialize import dumps
 
 P = ParamSpec("P")
 V = TypeVar("V")
 
+ADMIN_TOKEN = web.AppKey("admin_token", str)
+# seconds a request may take, unless it asks for less or more in its headers
+DEFAULT_DEADLINE = 30
+MAX_DEADLINE = 120
+
 
 def catch_common_exceptions(func: Callable[P, V]) -> Callable[P, V]:
     """
@@ -26,6 +32,10 @@ def catch_common_exceptions(func: Callable[P, V]) -> Callable[P, V]:
     async def wrapper(*args: P.args, **kwargs: P.kwargs) -> V:
         try:
             return await func(*args, **kwargs)
+        except web.HTTPException:
+            raise
+        except TimeoutError:
+            raise web.HTTPGatewayTimeout(reason="Upstream took too long")
         except LoginFailedException:
             raise web.HTTPUnauthorized(reason="Invalid username or password")
         except SpiderIOException:
@@ -36,6 +46,49 @@ def catch_common_exceptions(func: Callable[P, V]) -> Callable[P, V]:
     return wrapper
 
 
+def with_deadline(func: Callable[P, V]) -> Callable[P, V]:
+    """
+    Cancel the handler, and the spider work only it waits for, once the deadline of
+    its request passes; the resulting `TimeoutError` becomes a 504 in
+    `catch_common_exceptions`
+
+    Args:
+        func: the handler to wrap
+
+    Returns:
+        the wrapped handler
+    """
+
+    async def wrapper(request: Request, *args: P.args, **kwargs: P.kwargs) -> V:
+        async with asyncio.timeout(extract_deadline(request)):
+            return await func(request, *args, **kwargs)
+
+    return wrapper
+
+
+def extract_deadline(request: Request) -> float:
+    """
+    Extract the seconds the request may take
+
+    Args:
+        request: the request that may contain `request-timeout` in headers
+
+    Returns:
+        the seconds, at most `MAX_DEADLINE`
+    """
+
+    timeout = request.headers.get("request-timeout")
+    if timeout is None:
+        return DEFAULT_DEADLINE
+    try:
+        timeout = float(timeout)
+    except ValueError:
+        raise web.HTTPBadRequest(reason="Invalid request-timeout")
+    if not timeout > 0:
+        raise web.HTTPBadRequest(reason="Invalid request-timeout")
+    return min(timeout, MAX_DEADLINE)
+
+
 def extract_auth(request: Request) -> tuple[str, str]:
     """
     Extract username and password from the request
@@ -55,6 +108,24 @@ def extract_auth(request: Request) -> tuple[str, str]:
     return username, password
 
 
+def check_admin(request: Request) -> None:
+    """
+    Check that the request carries the admin token
+
+    Args:
+        request: the request that contains the admin token in headers
+
+    Returns:
+        None
+    """
+
+    token = request.app[ADMIN_TOKEN]
+    if not token or not hmac.compare_digest(
+        request.headers.get("admin-token", ""), token
+    ):
+        raise web.HTTPForbidden(reason="Invalid admin token")
+
+
 async def extract_course(request):
     query = request.rel_url.query
     course_id = query.get("id")
@@ -67,21 +138,45 @@ async def extract_course(request):
     return course_id, course_index, course_name
 
 
-class RobustEncoder(json.JSONEncoder):
-    def default(self, o):
-        if isinstance(o, Decimal):
-            return float(o)
-        if isinstance(o, pd.DataFrame):
-            return o.to_dict(orient="records")
-        if isinstance(o, pd.Series):
-            return o.to_dict()
-        if isinstance(o, pd.Timestamp):
-            return o.to_pydatetime().isoformat()
-        return super(RobustEncoder, self).default(o)
-
-
-def json_response(v: Any):
-    return web.Response(
-        text=json.dumps(v, cls=RobustEncoder),
-        content_type="application/json",
-    )
+def extract_force(request: Request) -> bool:
+    """
+    Extract whether the request asks to bypass cached upstream data
+
+    Args:
+        request: the request that may contain `force` in query
+
+    Returns:
+        whether to force fetching again
+    """
+
+    return request.rel_url.query.get("force", "").lower() in ("1", "true", "yes")
+
+
+def ndjson_line(course_id: Any, result: Any) -> bytes:
+    """
+    Encode the result of one course as an NDJSON line
+
+    Args:
+        course_id: the id of the course
+        result: the grade book items of the course, or the exception raised
+            fetching them
+
+    Returns:
+        the line, with the encoded items of a cached grade book reused
+    """
+
+    if isinstance(result, LoginFailedException):
+        line = dict(id=course_id, error="Invalid username or password")
+    elif isinstance(result, SpiderIOException):
+        line = dict(id=course_id, error="Spider failed to scrape")
+    elif isinstance(result, Exception):
+        line = dict(id=course_id, error=str(result))
+    else:
+        return b'{"id":%s,"items":%s}\n' % (dumps(course_id), dumps(result))
+    return dumps(line) + b"\n"
+
+
+def json_response(v: Any, request: Request | None = None):
+    if request is not None:
+        return conditional_response(request, v)
+    return web.Response(body=dumps(v), content_type="application/json")
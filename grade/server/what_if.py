@@ -0,0 +1,597 @@
+import math
+from collections.abc import Callable, Mapping, Sequence
+from typing import Any, NamedTuple, TypedDict
+
+import numpy as np
+import pandas as pd
+from numpy.typing import ArrayLike
+
+from grade.spider.model import *
+from grade.utils import to_decimal
+from .analyze import Backend, NUMERIC_COLUMNS
+
+FIELDS = [
+    "measure_type_id",
+    "measure_type_weight",
+    "measure_type_drop_score",
+    "points",
+    "max_points",
+    "max_score",
+    "is_for_grade",
+    "is_hidden",
+    "is_missing",
+    "comment_assignment_value",
+    "comment_penalty_percent",
+]
+# the fields an added item cannot do without
+REQUIRED_FIELDS = ["max_points", "max_score", "measure_type_id"]
+
+
+def flatten(item: Mapping[str, Any]) -> dict[str, Any]:
+    """
+    Flatten the nested measure type and comment of a (partial) grade book item into
+    prefixed fields, as `grade_book_items_to_df` does.
+    """
+
+    flat = {}
+    for k, v in item.items():
+        if k in ("measure_type", "comment") and isinstance(v, Mapping):
+            flat.update({f"{k}_{kk}": vv for kk, vv in v.items()})
+        else:
+            flat[k] = v
+    return flat
+
+
+Distribution = Callable[[np.random.Generator, int], np.ndarray]
+
+
+def _float(v: Any) -> float:
+    return math.nan if v is None else float(v)
+
+
+class Aggregate(NamedTuple):
+    total: Any
+    # the number of counted items
+    count: int
+    # the number of items, counted or not
+    size: int
+    weight: Any
+
+
+class ScoreNeeded(TypedDict):
+    """
+    The scores needed on the remaining items to reach a target final score.
+    """
+
+    target: float
+    feasible: bool
+    # the percentage of the max points needed on every remaining item, or None
+    # if even the highest allowed percentage falls short
+    uniform: float | None
+    # the points needed on each remaining item when the others get `others`
+    # percent of their max points, or None if out of reach
+    per_item: dict[GradeBookItem["id"], float | None]
+
+
+class Change(NamedTuple):
+    id: Any
+    before: dict[str, Any] | None
+    after: dict[str, Any] | None
+
+
+class WhatIf:
+    """
+    A what-if session over the grade book items of a course.
+
+    The session keeps the adjusted score of each item and the running sum and
+    count of each measure type, along with its weight, so changing, adding or
+    removing one item updates the score without touching the other items. Changes
+    can be undone and redone.
+
+    A measure type keeps the weight it starts with: added or updated items take
+    the weight of their measure type, unless they bring in a new one.
+    """
+
+    def __init__(self, items: Mapping[Any, Mapping[str, Any]], backend: Backend):
+        """
+        Args:
+            items: the flattened grade book items by id
+            backend: the numeric backend of the values
+        """
+
+        self.number = to_decimal if backend == "decimal" else float
+        self.zero, self.one, self.hundred = map(self.number, (0, 1, 100))
+        self.items: dict[Any, dict[str, Any]] = {}
+        self.adjusted: dict[Any, Any] = {}
+        self.aggregates: dict[MeasureType["id"], Aggregate] = {}
+        self.changed: set[Any] = set()
+        self.undos: list[Change] = []
+        self.redos: list[Change] = []
+        for item_id, item in items.items():
+            self._put(item_id, dict(item))
+
+    @classmethod
+    def from_df(cls, grade_book_items: pd.DataFrame) -> "WhatIf":
+        """
+        Start a session from the DataFrame of `grade_book_items_to_df`.
+        """
+
+        backend = (
+            "decimal" if grade_book_items["max_score"].dtype == object else "float"
+        )
+        return cls(grade_book_items[FIELDS].to_dict(orient="index"), backend)
+
+    @classmethod
+    def from_grade_book_items(cls, grade_book_items: list[GradeBookItem]) -> "WhatIf":
+        """
+        Start a session from grade book items, on the decimal backend.
+        """
+
+        return cls(
+            {
+                item["id"]: {**dict.fromkeys(FIELDS), **flatten(item)}
+                for item in grade_book_items
+            },
+            "decimal",
+        )
+
+    def _adjusted_score(self, item: Mapping[str, Any]) -> Any:
+        """
+        Calculate the adjusted score of one item, as `_calculate_adjusted_score`
+        does for a DataFrame, or None if the item does not count.
+        """
+
+        if not item["is_for_grade"] or item["is_hidden"]:
+            return None
+        zero = self.zero
+        points = zero if item["is_missing"] else item["points"]
+        if not pd.isna(item["comment_assignment_value"]):
+            points = item["comment_assignment_value"]
+        if pd.isna(points):
+            points = zero
+        score = points / item["max_points"] * item["max_score"]
+        if not pd.isna(item["comment_penalty_percent"]):
+            score = score * (self.one - item["comment_penalty_percent"] / self.hundred)
+        if not pd.isna(item["measure_type_drop_score"]):
+            score = score - item["measure_type_drop_score"]
+        if pd.isna(score):
+            return None
+        if not pd.isna(item["max_score"]) and score > item["max_score"]:
+            score = item["max_score"]
+        return score
+
+    def _aggregate(self, item: Mapping[str, Any], adjusted: Any, sign: int):
+        mt = item["measure_type_id"]
+        total, count, size, weight = self.aggregates.get(
+            mt, (self.zero, 0, 0, self.zero)
+        )
+        size += sign
+        if not size:
+            del self.aggregates[mt]
+            return
+        # a measure type takes the weight of the item that brings it in, and keeps
+        # it while it has items
+        if mt not in self.aggregates and not pd.isna(item["measure_type_weight"]):
+            weight = item["measure_type_weight"]
+        if adjusted is not None:
+            total += sign * adjusted
+            count += sign
+        self.aggregates[mt] = Aggregate(total, count, size, weight)
+
+    def _put(self, item_id: Any, item: dict[str, Any] | None):
+        if item_id in self.items:
+            self._aggregate(self.items.pop(item_id), self.adjusted.pop(item_id), -1)
+        if item is not None:
+            adjusted = self._adjusted_score(item)
+            self.items[item_id] = item
+            self.adjusted[item_id] = adjusted
+            self._aggregate(item, adjusted, 1)
+
+    def _number(self, key: str, v: Any) -> Any:
+        try:
+            n = self.number(v)
+            valid = not isinstance(v, bool) and math.isfinite(n)
+        except (TypeError, ValueError, ArithmeticError):
+            valid = False
+        if not valid or (key == "max_points" and n == 0):
+            raise ValueError(f"Invalid {key}: {v!r}")
+        return n
+
+    def _convert(self, fields: Mapping[str, Any]) -> dict[str, Any]:
+        return {
+            k: self._number(k, v) if k in NUMERIC_COLUMNS and v is not None else v
+            for k, v in flatten(fields).items()
+            if k != "id"
+        }
+
+    @staticmethod
+    def _check(item_id: Any, required: Mapping[str, Any]):
+        missing = [k for k, v in required.items() if v is None]
+        if missing:
+            raise ValueError(f"Missing {', '.join(missing)} of item {item_id!r}")
+
+    def _apply(self, item_id: Any, after: dict[str, Any] | None):
+        before = self.items.get(item_id)
+        if after is not None and after["measure_type_id"] in self.aggregates:
+            # the weight belongs to the measure type, so the item cannot change it
+            after["measure_type_weight"] = self.aggregates[
+                after["measure_type_id"]
+            ].weight
+        self._put(item_id, after)
+        self.changed.add(item_id)
+        self.undos.append(Change(item_id, before, after))
+        self.redos.clear()
+
+    def update(self, item_id: Any, fields: Mapping[str, Any]):
+        """
+        Change some fields of an item, e.g. its points. Raises ValueError if a
+        number is invalid or a needed field is cleared.
+
+        Args:
+            item_id: the id of the item
+            fields: the changed fields, flattened or nested like a grade book item
+        """
+
+        if item_id not in self.items:
+            raise KeyError(item_id)
+        fields = self._convert(fields)
+        self._check(item_id, {k: v for k, v in fields.items() if k in REQUIRED_FIELDS})
+        self._apply(item_id, {**self.items[item_id], **fields})
+
+    def add(self, item_id: Any, item: Mapping[str, Any]):
+        """
+        Add a hypothetical item. Raises ValueError if a number is invalid or a
+        needed field is missing.
+
+        Args:
+            item_id: the id of the item
+            item: the item, flattened or nested like a grade book item; it needs
+                `max_points`, `max_score` and `measure_type_id`, while the other
+                fields may be left out
+        """
+
+        item = self._convert(item)
+        self._check(item_id, {k: item.get(k) for k in REQUIRED_FIELDS})
+        self._apply(
+            item_id,
+            {
+                **dict.fromkeys(FIELDS),
+                "is_for_grade": True,
+                "is_hidden": False,
+                "is_missing": False,
+                **item,
+            },
+        )
+
+    def remove(self, item_id: Any):
+        """
+        Remove an item.
+        """
+
+        if item_id not in self.items:
+            raise KeyError(item_id)
+        self._apply(item_id, None)
+
+    def undo(self) -> bool:
+        """
+        Undo the last change.
+
+        Returns:
+            whether there was a change to undo
+        """
+
+        if not self.undos:
+            return False
+        change = self.undos.pop()
+        self._put(change.id, change.before)
+        self.redos.append(change)
+        return True
+
+    def redo(self) -> bool:
+        """
+        Redo the last undone change.
+
+        Returns:
+            whether there was a change to redo
+        """
+
+        if not self.redos:
+            return False
+        change = self.redos.pop()
+        self._put(change.id, change.after)
+        self.undos.append(change)
+        return True
+
+    @property
+    def score_by_measure_type(self) -> dict[MeasureType["id"], Decimal]:
+        """
+        The score of each measure type that has counted items.
+        """
+
+        return {
+            mt: a.total / a.count for mt, a in self.aggregates.items() if a.count
+        }
+
+    @property
+    def score(self) -> Decimal:
+        """
+        The final score, as `calculate_score` would calculate it.
+
+        It is calculated from the aggregates of the measure types, so its cost does
+        not depend on the number of items.
+        """
+
+        weighted = self.zero
+        weights = self.zero
+        for a in self.aggregates.values():
+            if a.count:
+                weighted += a.total / a.count * a.weight
+                weights += a.weight
+        return weighted / weights if weights else self.zero
+
+    def result(self) -> dict[str, Any]:
+        """
+        Get the score, the score of each measure type, and the adjusted score of
+        each changed item.
+        """
+
+        return dict(
+            score=self.score,
+            score_by_measure_type=self.score_by_measure_type,
+            adjusted_score={
+                k: self.adjusted.get(k) for k in self.changed if k in self.items
+            },
+        )
+
+    def scenarios(self, item_ids: Sequence[Any], points: ArrayLike) -> np.ndarray:
+        """
+        Calculate the final score of many scenarios at once.
+
+        Each scenario gives the points of the same few items, e.g. the upcoming
+        tests, which may have been added with `add` beforehand. The scores of the
+        other items only enter through the aggregates of their measure types, so
+        every scenario is scored by one broadcast over a scenarios x measure types
+        matrix, in floats.
+
+        Args:
+            item_ids: the ids of the items the scenarios give points for
+            points: a scenarios x items matrix of points
+
+        Returns:
+            the final score of each scenario
+        """
+
+        points = np.asarray(points, dtype=np.float64).reshape(-1, len(item_ids))
+        types = {mt: i for i, mt in enumerate(self.aggregates)}
+        total = np.array([_float(a.total) for a in self.aggregates.values()])
+        count = np.array([a.count for a in self.aggregates.values()], dtype=np.float64)
+        weight = np.array([_float(a.weight) for a in self.aggregates.values()])
+
+        membership = np.zeros((len(item_ids), len(types)))
+        max_points, max_score, factor, drop, value = np.full((5, len(item_ids)), np.nan)
+        for j, item_id in enumerate(item_ids):
+            item = self.items[item_id]
+            t = types[item["measure_type_id"]]
+            if self.adjusted[item_id] is not None:
+                total[t] -= _float(self.adjusted[item_id])
+                count[t] -= 1
+            max_points[j] = _float(item["max_points"])
+            max_score[j] = _float(item["max_score"])
+            if (
+                not item["is_for_grade"]
+                or item["is_hidden"]
+                or np.isnan(max_points[j] * max_score[j])
+            ):
+                continue
+            membership[j, t] = 1
+            count[t] += 1
+            factor[j] = 1 - _float(item["comment_penalty_percent"]) / 100
+            drop[j] = _float(item["measure_type_drop_score"])
+            value[j] = _float(item["comment_assignment_value"])
+
+        points = np.where(np.isnan(value), np.nan_to_num(points), value)
+        adjusted = points / max_points * max_score * np.nan_to_num(factor, nan=1)
+        adjusted = np.fmin(adjusted - np.nan_to_num(drop), max_score)
+        adjusted = np.nan_to_num(adjusted * membership.any(axis=1))
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = (total + adjusted @ membership) / count
+        weighted = np.where(count > 0, means * weight, 0).sum(axis=1)
+        weights = weight[count > 0].sum()
+        return weighted / weights if weights else np.zeros(len(points))
+
+    def remaining(self) -> list[Any]:
+        """
+        Get the ids of the counted items that have no points yet.
+        """
+
+        return [
+            k
+            for k, item in self.items.items()
+            if item["is_for_grade"]
+            and not item["is_hidden"]
+            and not item["is_missing"]
+            and pd.isna(item["points"])
+            and pd.isna(item["comment_assignment_value"])
+        ]
+
+    def score_needed(
+        self,
+        target: float,
+        item_ids: Sequence[Any] | None = None,
+        high: float = 100,
+        others: float = 0,
+    ) -> ScoreNeeded:
+        """
+        Find the lowest scores on the remaining items that reach a target final
+        score.
+
+        The final score is a concave, piecewise linear function of the percentage
+        of the max points given to the remaining items, since only the cap at the
+        max score bends it. If it is linear, which the midpoint tells, the answer is
+        solved in closed form. Otherwise it is searched on a grid, evaluated by
+        `scenarios` in one call.
+
+        Args:
+            target: the target final score
+            item_ids: the ids of the remaining items, the ungraded ones by default
+            high: the highest percentage of the max points allowed, above 100 for
+                extra credit
+            others: the percentage of the max points assumed for the other
+                remaining items when solving for one item
+
+        Returns:
+            the uniform percentage, and the points of each item, needed
+        """
+
+        item_ids = self.remaining() if item_ids is None else list(item_ids)
+        k = len(item_ids)
+        if not k:
+            # nothing left to score, so the target is reached already or never
+            feasible = bool(self.score >= target)
+            return ScoreNeeded(
+                target=target,
+                feasible=feasible,
+                uniform=0.0 if feasible else None,
+                per_item={},
+            )
+        max_points = np.array(
+            [_float(self.items[i]["max_points"]) for i in item_ids]
+        ).reshape(1, k)
+
+        def all_items(percents: np.ndarray) -> np.ndarray:
+            points = percents.reshape(-1, 1) / 100 * max_points
+            return self.scenarios(item_ids, points).reshape(percents.shape)
+
+        def each_item(percents: np.ndarray) -> np.ndarray:
+            # one block of candidates per item, the others at `others` percent
+            m = percents.shape[1]
+            points = np.repeat(others / 100 * max_points, k * m, axis=0)
+            rows = np.arange(k * m)
+            points[rows, rows // m] = percents.ravel() / 100 * max_points[0, rows // m]
+            return self.scenarios(item_ids, points).reshape(k, m)
+
+        u = _solve(all_items, 1, target, high)[0]
+        per = _solve(each_item, k, target, high) / 100 * max_points[0]
+        return ScoreNeeded(
+            target=target,
+            feasible=not math.isnan(u),
+            uniform=None if math.isnan(u) else u,
+            per_item={
+                i: None if math.isnan(v) else v for i, v in zip(item_ids, per.tolist())
+            },
+        )
+
+
+def _solve(
+    evaluate: Callable[[np.ndarray], np.ndarray],
+    n: int,
+    target: float,
+    high: float,
+    steps: int = 1024,
+) -> np.ndarray:
+    """
+    Find the lowest percentage reaching the target in each of `n` problems, whose
+    final score is concave and nondecreasing in the percentage.
+
+    Args:
+        evaluate: maps an n x m matrix of percentages to their final scores
+        n: the number of problems
+        target: the target final score
+        high: the highest percentage allowed
+        steps: the number of steps of the grid search
+
+    Returns:
+        the percentage of each problem, 0 if reached already, NaN if out of reach
+    """
+
+    ends = evaluate(np.tile([0, high / 2, high], (n, 1)).astype(np.float64))
+    low, mid, top = ends.T
+    with np.errstate(invalid="ignore", divide="ignore"):
+        result = (target - low) / (top - low) * high
+    linear = np.isclose(mid, (low + top) / 2)
+    if not linear.all():
+        grid = np.linspace(0, high, steps + 1)
+        scores = evaluate(np.tile(grid, (n, 1)))
+        i = np.clip(np.argmax(scores >= target, axis=1), 1, steps)
+        rows = np.arange(n)
+        a, b = scores[rows, i - 1], scores[rows, i]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            found = grid[i - 1] + (target - a) / (b - a) * (grid[i] - grid[i - 1])
+        result = np.where(linear, result, found)
+    result = np.where(low >= target, 0, result)
+    return np.where(top >= target, np.clip(result, 0, high), np.nan)
+
+
+def uniform(low: float, high: float) -> Distribution:
+    """
+    Points drawn uniformly from `low` to `high`.
+    """
+
+    return lambda rng, n: rng.uniform(low, high, n)
+
+
+def normal(
+    mean: float, sd: float, low: float = 0, high: float = math.inf
+) -> Distribution:
+    """
+    Points drawn from a normal distribution, clipped to `low` and `high`.
+    """
+
+    return lambda rng, n: np.clip(rng.normal(mean, sd, n), low, high)
+
+
+def empirical(values: ArrayLike) -> Distribution:
+    """
+    Points drawn from past points, e.g. the points of the other items of the same
+    measure type.
+    """
+
+    values = np.asarray(values, dtype=np.float64)
+    return lambda rng, n: rng.choice(values, n)
+
+
+def sample_points(
+    distributions: Sequence[Distribution], n: int, seed: int | None = None
+) -> np.ndarray:
+    """
+    Sample scenarios for `WhatIf.scenarios`.
+
+    Args:
+        distributions: the distribution of the points of each item
+        n: the number of scenarios
+        seed: the seed of the random generator
+
+    Returns:
+        a scenarios x items matrix of points
+    """
+
+    rng = np.random.default_rng(seed)
+    return np.column_stack([d(rng, n) for d in distributions])
+
+
+def grid_points(values: ArrayLike, k: int) -> np.ndarray:
+    """
+    Enumerate every combination of points of `k` items, e.g. every score from 0 to
+    100 on the next 3 tests.
+
+    Args:
+        values: the possible points of each item
+        k: the number of items
+
+    Returns:
+        a scenarios x items matrix of points
+    """
+
+    values = np.asarray(values, dtype=np.float64)
+    return np.stack(np.meshgrid(*[values] * k, indexing="ij"), axis=-1).reshape(-1, k)
+
+
+def percentiles(
+    scores: ArrayLike, q: Sequence[float] = (5, 25, 50, 75, 95)
+) -> dict[float, float]:
+    """
+    Summarize the final scores of scenarios by their percentiles.
+    """
+
+    return dict(zip(q, np.nanpercentile(scores, q).tolist()))
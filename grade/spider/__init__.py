@@ -1,19 +1,37 @@
-from .exception import LoginFailedException, SpiderIOException
+from .exception import (
+    LoginFailedException,
+    SessionExpiredException,
+    SpiderIOException,
+)
 from .facade import (
     get_course,
     get_courses,
     get_grade_book_items,
+    invalidate,
+    iter_grade_book_items,
 )
+from .grade_book import GradeBook, GradeBookItemView
 from .model import MeasureType, Comment, GradeBookItem, Course
-from .parse import parse_grade_book_items, parse_comments, parse_measure_types
+from .parse import (
+    parse_grade_book_items,
+    parse_grade_book_items_df,
+    parse_comments,
+    parse_measure_types,
+)
 from .session_manager import manager
+from .session_store import SessionStore
 
 __all__ = [
     "get_course",
     "get_courses",
     "get_grade_book_items",
+    "invalidate",
+    "iter_grade_book_items",
     "Course",
     "GradeBookItem",
+    "GradeBook",
+    "GradeBookItemView",
     "Comment",
     "MeasureType",
+    "SessionStore",
 ]
@@ -1,3 +1,8 @@
 from yarl import URL
 
 DASHBOARD_URL = URL("https://apps.gwinnett.k12.ga.us/")
+
+# seconds before the grade book page is fetched again
+GRADE_BOOK_TTL = 60
+# seconds before the data of a course is fetched again, even if unchanged
+COURSE_TTL = 30 * 60
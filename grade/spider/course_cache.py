@@ -0,0 +1,137 @@
+import asyncio
+import math
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any, Generic, NamedTuple, TypeVar
+from weakref import WeakKeyDictionary
+
+import aiohttp
+
+from grade.utils import join
+
+V = TypeVar("V")
+
+
+class CourseEntry(NamedTuple, Generic[V]):
+    fingerprint: str
+    data: V
+    expires: float
+
+
+class CourseCache(Generic[V]):
+    """
+    A cache of per-course data, keyed by session and course id.
+
+    An entry is reused until the fingerprint of its course changes or its ttl runs
+    out. Concurrent requests of the same course share one fetch, and entries can be
+    invalidated per course or per session without touching the others.
+    """
+
+    def __init__(self, ttl: float | None = None):
+        """
+        Args:
+            ttl: the default seconds an entry is kept, None to keep it until its
+                fingerprint changes
+        """
+
+        self.ttl = math.inf if ttl is None else ttl
+        self.ttls: dict[Any, float] = {}
+        self.entries: WeakKeyDictionary[
+            aiohttp.ClientSession, dict[Any, CourseEntry[V]]
+        ] = WeakKeyDictionary()
+        self.pending: WeakKeyDictionary[
+            aiohttp.ClientSession, dict[Any, asyncio.Task[V]]
+        ] = WeakKeyDictionary()
+
+    def set_ttl(self, course_id: Any, ttl: float | None) -> None:
+        """
+        Set the seconds the entries of a course are kept, None to use the default.
+        """
+
+        if ttl is None:
+            self.ttls.pop(course_id, None)
+        else:
+            self.ttls[course_id] = ttl
+
+    async def __call__(
+        self,
+        s: aiohttp.ClientSession,
+        course_id: Any,
+        fingerprint: str,
+        fetch: Callable[[], Awaitable[V]],
+        force: bool = False,
+    ) -> V:
+        """
+        Get the data of a course, fetching it if it is missing, expired or outdated.
+
+        Args:
+            s: the session
+            course_id: the id of the course
+            fingerprint: the current fingerprint of the course
+            fetch: fetches the data of the course
+            force: fetch even if the cached entry is still valid
+
+        Returns:
+            the data of the course
+        """
+
+        entry = self.entries.get(s, {}).get(course_id)
+        if (
+            not force
+            and entry is not None
+            and entry.fingerprint == fingerprint
+            and time.monotonic() < entry.expires
+        ):
+            return entry.data
+        pending = self.pending.setdefault(s, {})
+        task = pending.get(course_id)
+        if task is None:
+            task = asyncio.ensure_future(
+                self._fetch(s, course_id, fingerprint, fetch)
+            )
+            pending[course_id] = task
+        return await join(task)
+
+    async def _fetch(
+        self,
+        s: aiohttp.ClientSession,
+        course_id: Any,
+        fingerprint: str,
+        fetch: Callable[[], Awaitable[V]],
+    ) -> V:
+        try:
+            data = await fetch()
+        finally:
+            pending = self.pending.get(s, {})
+            current = pending.get(course_id) is asyncio.current_task()
+            if current:
+                del pending[course_id]
+        if current:
+            expires = time.monotonic() + self.ttls.get(course_id, self.ttl)
+            self.entries.setdefault(s, {})[course_id] = CourseEntry(
+                fingerprint, data, expires
+            )
+        return data
+
+    def peek(self, s: aiohttp.ClientSession) -> dict[Any, V]:
+        """
+        Get the cached data of every course of a session, valid or not.
+        """
+
+        return {k: e.data for k, e in self.entries.get(s, {}).items()}
+
+    def invalidate(self, s: aiohttp.ClientSession, course_id: Any = None) -> None:
+        """
+        Drop the cached data of one course of a session, or of all its courses.
+
+        Args:
+            s: the session
+            course_id: the id of the course, None for all courses
+        """
+
+        if course_id is None:
+            self.entries.pop(s, None)
+            self.pending.pop(s, None)
+        else:
+            self.entries.get(s, {}).pop(course_id, None)
+            self.pending.get(s, {}).pop(course_id, None)
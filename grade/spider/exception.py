@@ -25,3 +25,7 @@ class SpiderIOException(Exception):
 
 class LoginFailedException(SpiderIOException):
     pass
+
+
+class SessionExpiredException(SpiderIOException):
+    pass
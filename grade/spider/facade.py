@@ -1,25 +1,37 @@
+import asyncio
 import re
+from collections.abc import AsyncIterator, Iterable
+from typing import Any
 
-from .model import GradeBookItem, Course
-from .parse import parse_grade_book_items
+from .grade_book import GradeBook
+from .model import Course
 from .session_manager import manager
-from .spider import courses, get_course_data, resolve_course
+from .spider import course_data, courses, get_grade_book, refresh, resolve_course
 
 
-async def get_courses(username: str, password: str) -> list[Course]:
+async def get_courses(
+    username: str,
+    password: str,
+    force: bool = False,
+) -> list[Course]:
     """
     Get the courses for the specified user.
 
     Args:
         username: the username of the user
         password: the password of the user
+        force: fetch the grade book page again instead of using the cached one
 
     Returns:
         the courses
     """
 
-    s = await manager.get_session(username, password)
-    cs = await courses(s)
+    async def fetch(session):
+        if force:
+            refresh(session)
+        return await courses(session)
+
+    cs = await manager.call(username, password, fetch)
     course_re = re.compile(r"(?P<period>\d+):\s*(?P<name>.+?)\s*$")
     matches = [course_re.match(c.get("course")) for c in cs]
     return [
@@ -42,6 +54,7 @@ async def get_course(
     course_id: int | str = -1,
     course_name: str = "",
     course_index: int = -1,
+    force: bool = False,
 ) -> Course:
     """
     Get the course for the specified user.
@@ -53,12 +66,13 @@ async def get_course(
             course_id: the id of the course
             course_name: the name of the course
             course_index: the index of the course in the list of courses
+        force: fetch the grade book page again instead of using the cached one
 
     Returns:
         the course
     """
 
-    cs = await get_courses(username, password)
+    cs = await get_courses(username, password, force)
     if course_id != -1:
         return next(c for c in cs if str(c.get("id")) == str(course_id))
     if course_name:
@@ -74,10 +88,15 @@ async def get_grade_book_items(
     course_id: int | str = -1,
     course_name: str = "",
     course_index: int = -1,
-) -> list[GradeBookItem]:
+    force: bool = False,
+) -> GradeBook:
     """
     Get the grade book items for the specified user and course.
 
+    Items are only fetched again when the row of the course in the grade book page
+    changed, unless forced. They are returned as a `GradeBook`, a sequence of
+    read-only `GradeBookItem` views.
+
     Args:
         username: the username of the user
         password: the password of the user
@@ -85,18 +104,110 @@ async def get_grade_book_items(
             course_id: the id of the course
             course_name: the name of the course
             course_index: the index of the course in the list of courses
+        force: fetch the grade book page and the items again
 
     Returns:
         the grade book items
     """
 
-    course = await get_course(username, password, course_id, course_name, course_index)
-    session = await manager.get_session(username, password)
-    class_data, items_data = await get_course_data(
-        session,
-        await resolve_course(session, query=course["id"], query_type="id"),
-    )
-    return parse_grade_book_items(
-        class_data,
-        items_data,
+    course = await get_course(
+        username, password, course_id, course_name, course_index, force
     )
+
+    async def fetch(session):
+        return await get_grade_book(
+            session,
+            await resolve_course(session, query=course["id"], query_type="id"),
+            force,
+        )
+
+    return await manager.call(username, password, fetch)
+
+
+async def iter_grade_book_items(
+    username: str,
+    password: str,
+    course_ids: Iterable[int | str] | None = None,
+    force: bool = False,
+) -> AsyncIterator[tuple[Any, GradeBook | Exception]]:
+    """
+    Get the grade book items of several courses, each as soon as it is ready.
+
+    The courses are listed once and every course is fetched at once, so the caller
+    does not wait behind the slowest course or repeat the course lookup per course.
+    Courses already being fetched, by this or another request, are shared.
+
+    Args:
+        username: the username of the user
+        password: the password of the user
+        course_ids: the ids of the courses, all courses if None
+        force: fetch the grade book page and the items again
+
+    Returns:
+        the id and the grade book items, or the exception raised fetching them,
+        of each course in order of completion; unknown ids come first with a
+        LookupError
+    """
+
+    async def list_courses(session):
+        if force:
+            refresh(session)
+        return await courses(session)
+
+    cs = await manager.call(username, password, list_courses)
+    if course_ids is not None:
+        # ids are matched as strings, and unknown ones are given back as passed
+        wanted = {}
+        for course_id in course_ids:
+            wanted.setdefault(str(course_id), course_id)
+        by_id = {str(c["id"]): c for c in cs}
+        for key, course_id in wanted.items():
+            if key not in by_id:
+                yield course_id, LookupError(f"No course with id {course_id}")
+        cs = [by_id[key] for key in wanted if key in by_id]
+
+    def fetch(c):
+        return manager.call(
+            username, password, lambda session: get_grade_book(session, c, force)
+        )
+
+    pending = {asyncio.ensure_future(fetch(c)): c["id"] for c in cs}
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                course_id = pending.pop(task)
+                try:
+                    result = task.result()
+                except Exception as e:
+                    result = e
+                yield course_id, result
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def invalidate(
+    username: str,
+    password: str,
+    course_id: int | str | None = None,
+) -> None:
+    """
+    Drop the cached data of one course of the specified user, or of all their
+    courses, so it is fetched again on the next request.
+
+    Args:
+        username: the username of the user
+        password: the password of the user
+        course_id: the id of the course, None for all courses
+    """
+
+    session = manager.peek_session(username, password)
+    if session is None:
+        return
+    if course_id is None:
+        course_data.invalidate(session)
+        return
+    for cached_id in list(course_data.peek(session)):
+        if str(cached_id) == str(course_id):
+            course_data.invalidate(session, cached_id)
@@ -0,0 +1,260 @@
+import sys
+from collections.abc import Callable, Iterator, Mapping, Sequence
+from decimal import Decimal
+from typing import Any, overload
+
+import numpy as np
+import pandas as pd
+
+from grade.utils import sizeof, to_decimal
+from grade.utils.df import records_to_df
+from .model import Comment, GradeBookItem, MeasureType
+
+DECIMAL_FIELDS = ["points", "max_points", "score", "max_score"]
+BOOL_FIELDS = ["is_for_grade", "is_hidden", "is_missing"]
+KEYS = (
+    "id",
+    "name",
+    "points",
+    "max_points",
+    "score",
+    "max_score",
+    "due_date",
+    "is_for_grade",
+    "is_hidden",
+    "is_missing",
+    "measure_type",
+    "comment",
+)
+MEASURE_TYPE_DECIMALS = ["weight", "drop_score"]
+COMMENT_DECIMALS = ["assignment_value", "penalty_percent"]
+NAN = to_decimal("NaN")
+
+
+def _convert(
+    record: Mapping[str, Any], keys: list[str], number: Callable[[Decimal], Any]
+) -> dict[str, Any]:
+    return {k: number(v) if k in keys else v for k, v in record.items()}
+
+
+def _factorize(values: Sequence[Any]) -> tuple[np.ndarray, list[Any]]:
+    """
+    Split values into int32 codes, -1 for missing values, and a table of the
+    distinct values, so equal values share one object.
+    """
+
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+    return codes.astype(np.int32), list(uniques)
+
+
+class GradeBook(Sequence[GradeBookItem]):
+    """
+    The grade book items of a course, stored by column.
+
+    Numbers are stored as codes into a table of distinct `Decimal`s, dates as a
+    datetime64 array and flags as bool arrays. Measure types and comments are
+    shared tables indexed by code, and names are interned. Items are read through
+    lazy `GradeBookItemView`s, which behave like and serialize as
+    `GradeBookItem` dicts.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        """
+        Args:
+            df: the grade book items, in the layout of `parse_grade_book_items_df`
+        """
+
+        self.ids = df.index.to_numpy(copy=True)
+        self.names = tuple(
+            sys.intern(n) if isinstance(n, str) else n for n in df["name"].tolist()
+        )
+        self.decimals = {c: _factorize(df[c].tolist()) for c in DECIMAL_FIELDS}
+        self.due_dates = pd.to_datetime(df["due_date"]).to_numpy(copy=True)
+        self.flags = {c: df[c].to_numpy(dtype=bool, copy=True) for c in BOOL_FIELDS}
+
+        self.measure_type_codes, measure_type_ids = _factorize(
+            df["measure_type_id"].tolist()
+        )
+        measure_types = (
+            df.drop_duplicates("measure_type_id")
+            .set_index("measure_type_id")
+            .reindex(measure_type_ids)
+        )
+        self.measure_types = [
+            MeasureType(id=id, name=name, weight=weight, drop_score=drop_score)
+            if not pd.isna(name)
+            else None
+            for id, name, weight, drop_score in zip(
+                measure_type_ids,
+                measure_types["measure_type_name"].tolist(),
+                measure_types["measure_type_weight"].tolist(),
+                measure_types["measure_type_drop_score"].tolist(),
+            )
+        ]
+
+        has_comment = df["comment_code"].notna() | df["comment_content"].notna()
+        comments = list(
+            zip(
+                df["comment_code"].tolist(),
+                df["comment_content"].tolist(),
+                df["comment_assignment_value"].tolist(),
+                df["comment_penalty_percent"].tolist(),
+            )
+        )
+        # NaN never equals itself, so comments are told apart by their text
+        self.comment_codes, keys = _factorize(
+            [
+                repr(c) if present else None
+                for present, c in zip(has_comment.tolist(), comments)
+            ]
+        )
+        first = dict(zip(reversed(self.comment_codes.tolist()), reversed(comments)))
+        self.comments = [
+            Comment(
+                code=None if pd.isna(code) else code,
+                content=sys.intern(content) if isinstance(content, str) else None,
+                assignment_value=assignment_value,
+                penalty_percent=penalty_percent,
+            )
+            for code, content, assignment_value, penalty_percent in (
+                first[i] for i in range(len(keys))
+            )
+        ]
+
+    @classmethod
+    def from_items(cls, grade_book_items: Sequence[GradeBookItem]) -> "GradeBook":
+        """
+        Build a grade book from grade book item dicts.
+        """
+
+        return cls(
+            records_to_df(
+                grade_book_items,
+                index="id",
+                comment=Comment,
+                measure_type=MeasureType,
+            )
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @overload
+    def __getitem__(self, i: int) -> "GradeBookItemView": ...
+
+    @overload
+    def __getitem__(self, i: slice) -> list["GradeBookItemView"]: ...
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [GradeBookItemView(self, j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return GradeBookItemView(self, i)
+
+    def get(self, key: str, i: int) -> Any:
+        """
+        Get one field of the item at index `i`.
+        """
+
+        if key in self.decimals:
+            codes, table = self.decimals[key]
+            code = codes.item(i)
+            return NAN if code < 0 else table[code]
+        if key in self.flags:
+            return self.flags[key].item(i)
+        if key == "id":
+            return self.ids.item(i)
+        if key == "name":
+            return self.names[i]
+        if key == "due_date":
+            return pd.Timestamp(self.due_dates[i])
+        if key == "measure_type":
+            code = self.measure_type_codes.item(i)
+            return None if code < 0 else self.measure_types[code]
+        if key == "comment":
+            code = self.comment_codes.item(i)
+            return None if code < 0 else self.comments[code]
+        raise KeyError(key)
+
+    def to_records(
+        self,
+        number: Callable[[Decimal], Any] | None = None,
+        dates: Callable[[np.ndarray], Sequence[Any]] | None = None,
+    ) -> list[GradeBookItem]:
+        """
+        Materialize the grade book items as dicts.
+
+        Args:
+            number: converts each distinct `Decimal`, e.g. to float for JSON; it is
+                called once per distinct value rather than once per item
+            dates: converts the datetime64 array of due dates as a whole
+
+        Returns:
+            the grade book items
+        """
+
+        if number is None:
+            return [dict(item) for item in self]
+        tables = {
+            c: [number(v) for v in table] + [number(NAN)]
+            for c, (_, table) in self.decimals.items()
+        }
+        measure_types = [
+            None if mt is None else _convert(mt, MEASURE_TYPE_DECIMALS, number)
+            for mt in self.measure_types
+        ] + [None]
+        comments = [
+            _convert(c, COMMENT_DECIMALS, number) for c in self.comments
+        ] + [None]
+        due_dates = (
+            [pd.Timestamp(d) for d in self.due_dates]
+            if dates is None
+            else dates(self.due_dates)
+        )
+        columns = [
+            self.ids.tolist(),
+            self.names,
+            *(
+                [tables[c][code] for code in self.decimals[c][0].tolist()]
+                for c in DECIMAL_FIELDS
+            ),
+            due_dates,
+            *(self.flags[c].tolist() for c in BOOL_FIELDS),
+            [measure_types[code] for code in self.measure_type_codes.tolist()],
+            [comments[code] for code in self.comment_codes.tolist()],
+        ]
+        return [dict(zip(KEYS, values)) for values in zip(*columns)]
+
+    def __sizeof__(self) -> int:
+        seen = set()
+        return object.__sizeof__(self) + sum(
+            sizeof(v, seen) for v in vars(self).values()
+        )
+
+
+class GradeBookItemView(Mapping[str, Any]):
+    """
+    A read-only view of one item of a `GradeBook`, with the keys of a
+    `GradeBookItem`.
+    """
+
+    __slots__ = ("book", "i")
+
+    def __init__(self, book: GradeBook, i: int):
+        self.book = book
+        self.i = i
+
+    def __getitem__(self, key: str) -> Any:
+        return self.book.get(key, self.i)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(KEYS)
+
+    def __len__(self) -> int:
+        return len(KEYS)
+
+    def __repr__(self) -> str:
+        return f"GradeBookItemView({dict(self)!r})"
@@ -3,6 +3,8 @@ from datetime import datetime
 from decimal import Decimal
 from typing import TypedDict, NotRequired
 
+from yarl import URL
+
 
 class MeasureType(TypedDict):
     """
@@ -63,3 +65,13 @@ class Course(TypedDict):
     grade: Decimal
     email: str
     period: str
+
+
+class VueContext(TypedDict):
+    """
+    The result of the StudentVUE handshake of a session.
+    """
+
+    base_url: URL
+    navigations: list[tuple[str, URL]]
+    grade_book_url: URL
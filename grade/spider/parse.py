@@ -1,12 +1,15 @@
 import itertools as it
-from datetime import datetime
-from functools import cache
+from decimal import Decimal
+from typing import get_type_hints
 
 import pandas as pd
 
-from grade.utils import to_decimal, first, get, identifier
+from grade.utils import to_decimal, get, identifier
 from .model import MeasureType, Comment, GradeBookItem
 
+MEASURE_TYPE_FIELDS = list(get_type_hints(MeasureType))
+COMMENT_FIELDS = list(get_type_hints(Comment))
+
 
 def parse_measure_types(class_data: dict[str, any]) -> list[MeasureType]:
     measure_types = class_data.get("measureTypes", [])
@@ -34,10 +37,30 @@ def parse_comments(class_data: dict[str, any]) -> list[Comment]:
     ]
 
 
-def parse_grade_book_items(
+def _decimals(column: pd.Series) -> list[Decimal]:
+    return [to_decimal(v) for v in column.tolist()]
+
+
+def parse_grade_book_items_df(
     class_data: dict[str, any],
     items_data: dict[str, any],
-) -> list[GradeBookItem]:
+) -> pd.DataFrame:
+    """
+    Parse the grade book items into a flat DataFrame indexed by id, with the
+    measure type and comment of each item in `measure_type_*` and `comment_*`
+    columns, i.e. the layout of `grade_book_items_to_df`.
+
+    Every column is converted as a whole, and measure types and comments are
+    looked up by index instead of per item.
+
+    Args:
+        class_data: the class data of the course
+        items_data: the items of the course
+
+    Returns:
+        the DataFrame
+    """
+
     items_df = pd.DataFrame(
         list(it.chain(*get(items_data, "responseData.data.*.items")))
     ).rename(identifier, axis="columns")
@@ -51,36 +74,140 @@ def parse_grade_book_items(
         right_on="grade_book_id",
         validate="one_to_one",
     )
-    comments = parse_comments(class_data)
-
-    @cache
-    def get_comment_by_code(code) -> Comment:
-        return first(filter(lambda c: c.get("code") == code, comments))
-
-    measure_types = parse_measure_types(class_data)
-
-    @cache
-    def get_measure_type_by_id(id) -> MeasureType:
-        return first(filter(lambda mt: mt.get("id") == id, measure_types))
-
-    def transform(series: pd.Series) -> GradeBookItem:
-        comment = get_comment_by_code(series.comment_code)
-        if series.comment_text:
-            comment["content"] = series.comment_text
-        measure_type = get_measure_type_by_id(series.measure_type_id)
-        return GradeBookItem(
-            id=series.grade_book_id,
-            name=series.title,
-            points=to_decimal(series.points),
-            max_points=to_decimal(series.max_value),
-            score=to_decimal(series.score),
-            max_score=to_decimal(series.max_score),
-            due_date=datetime.fromisoformat(series.due_date_x),
-            is_for_grade=series.is_for_grading,
-            is_hidden=series.hide_in_portal,
-            is_missing=series.is_grade_book_missing_mark,
-            measure_type=measure_type,
+
+    measure_types = (
+        pd.DataFrame(parse_measure_types(class_data), columns=MEASURE_TYPE_FIELDS)
+        .drop_duplicates("id")
+        .set_index("id")
+        .reindex(df["measure_type_id"])
+    )
+    comments = (
+        pd.DataFrame(parse_comments(class_data), columns=COMMENT_FIELDS)
+        .drop_duplicates("code")
+        .set_index("code")
+        .reindex(df["comment_code"])
+    )
+    text = df["comment_text"].fillna("").astype(bool)
+    has_comment = comments["content"].notna().to_numpy() | text.to_numpy()
+
+    return pd.DataFrame(
+        {
+            "name": df["title"].to_numpy(),
+            "points": _decimals(df["points"]),
+            "max_points": _decimals(df["max_value"]),
+            "score": _decimals(df["score"]),
+            "max_score": _decimals(df["max_score"]),
+            "due_date": pd.to_datetime(df["due_date_x"], format="ISO8601").to_numpy(),
+            "is_for_grade": df["is_for_grading"].to_numpy(),
+            "is_hidden": df["hide_in_portal"].to_numpy(),
+            "is_missing": df["is_grade_book_missing_mark"].to_numpy(),
+            "comment_code": df["comment_code"].where(has_comment).to_numpy(),
+            "comment_content": df["comment_text"]
+            .where(text, comments["content"].to_numpy())
+            .to_numpy(),
+            "comment_assignment_value": comments["assignment_value"].to_numpy(),
+            "comment_penalty_percent": comments["penalty_percent"].to_numpy(),
+            "measure_type_id": df["measure_type_id"].to_numpy(),
+            "measure_type_name": measure_types["name"].to_numpy(),
+            "measure_type_weight": measure_types["weight"].to_numpy(),
+            "measure_type_drop_score": measure_types["drop_score"].to_numpy(),
+        },
+        index=pd.Index(df["grade_book_id"].to_numpy(), name="id"),
+    )
+
+
+def grade_book_items_df_to_records(df: pd.DataFrame) -> list[GradeBookItem]:
+    """
+    Build grade book items from a DataFrame in the layout of
+    `parse_grade_book_items_df`.
+
+    Items of the same measure type share one measure type dict.
+
+    Args:
+        df: the DataFrame
+
+    Returns:
+        the grade book items
+    """
+
+    mt_df = df.drop_duplicates("measure_type_id")
+    mt_df = mt_df[mt_df["measure_type_name"].notna()]
+    measure_types = {
+        id: MeasureType(id=id, name=name, weight=weight, drop_score=drop_score)
+        for id, name, weight, drop_score in zip(
+            mt_df["measure_type_id"].tolist(),
+            mt_df["measure_type_name"].tolist(),
+            mt_df["measure_type_weight"].tolist(),
+            mt_df["measure_type_drop_score"].tolist(),
+        )
+    }
+    has_comment = df["comment_code"].notna() | df["comment_content"].notna()
+    comments = [
+        Comment(
+            code=code,
+            content=content,
+            assignment_value=assignment_value,
+            penalty_percent=penalty_percent,
+        )
+        if present
+        else None
+        for present, code, content, assignment_value, penalty_percent in zip(
+            has_comment.tolist(),
+            df["comment_code"].tolist(),
+            df["comment_content"].tolist(),
+            df["comment_assignment_value"].tolist(),
+            df["comment_penalty_percent"].tolist(),
+        )
+    ]
+    return [
+        GradeBookItem(
+            id=id,
+            name=name,
+            points=points,
+            max_points=max_points,
+            score=score,
+            max_score=max_score,
+            due_date=due_date,
+            is_for_grade=is_for_grade,
+            is_hidden=is_hidden,
+            is_missing=is_missing,
+            measure_type=measure_types.get(measure_type_id),
             comment=comment,
         )
+        for (
+            id,
+            name,
+            points,
+            max_points,
+            score,
+            max_score,
+            due_date,
+            is_for_grade,
+            is_hidden,
+            is_missing,
+            measure_type_id,
+            comment,
+        ) in zip(
+            df.index.tolist(),
+            df["name"].tolist(),
+            df["points"].tolist(),
+            df["max_points"].tolist(),
+            df["score"].tolist(),
+            df["max_score"].tolist(),
+            df["due_date"].tolist(),
+            df["is_for_grade"].tolist(),
+            df["is_hidden"].tolist(),
+            df["is_missing"].tolist(),
+            df["measure_type_id"].tolist(),
+            comments,
+        )
+    ]
 
-    return df.apply(transform, axis="columns").tolist()
+
+def parse_grade_book_items(
+    class_data: dict[str, any],
+    items_data: dict[str, any],
+) -> list[GradeBookItem]:
+    return grade_book_items_df_to_records(
+        parse_grade_book_items_df(class_data, items_data)
+    )
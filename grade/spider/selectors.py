@@ -0,0 +1,26 @@
+from lxml.etree import XPath
+
+# dashboard
+APPS = XPath('//*[text()="MY eCLASS Apps"]/following-sibling::ul/li')
+APP_NAME = XPath("a/span/text()")
+APP_HREF = XPath("a/@href")
+
+# grade book, relative to the gradebook-content div
+COURSE_ROWS = XPath(
+    './/div[contains(@class, "header")]'
+    '/following-sibling::div[div[contains(@class, "row")]]'
+    "/div"
+)
+COURSE_NAME = XPath("div[1]/button/text()")
+TEACHER_NAME = XPath('.//span[contains(@class, "teacher")]//a/text()')
+TEACHER_HREF = XPath('.//span[contains(@class, "teacher")]//a/@href')
+MARK = XPath('.//span[contains(@class, "mark")]/text()')
+FOCUS = XPath(".//button/@data-focus")
+
+
+def is_head_script(el) -> bool:
+    return el.getparent() is not None and el.getparent().tag == "head"
+
+
+def is_grade_book_content(el) -> bool:
+    return el.get("id") == "gradebook-content"
@@ -1,30 +1,283 @@
+import asyncio
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from typing import Any, TypeVar
+
 import aiohttp
 
-from .exception import LoginFailedException
+from grade.utils import LOGGER, join
+from .exception import (
+    LoginFailedException,
+    SessionExpiredException,
+    SpiderIOException,
+)
 from .constants import DASHBOARD_URL
+from .session_store import SessionStore, load_cookies
+from .spider import bootstrap, footprint, forget, invalidate, ping, resume
+
+V = TypeVar("V")
 
 
 class SessionManager:
-    def __init__(self):
-        self.sessions = {}
+    def __init__(
+        self,
+        store: SessionStore | None = None,
+        limit: int = 100,
+        limit_per_host: int = 30,
+        ttl_dns_cache: int = 300,
+        keepalive_timeout: float = 30,
+        max_logins: int = 8,
+        max_sessions: int = 128,
+        idle_timeout: float = 60 * 60,
+        reap_interval: float = 60,
+        keepalive_interval: float | None = None,
+        keepalive_window: float = 15 * 60,
+    ):
+        """
+        Args:
+            store: where to keep sessions across restarts, if anywhere
+            limit: the maximum number of connections of all sessions together
+            limit_per_host: the maximum number of connections to one host
+            ttl_dns_cache: seconds a resolved host is cached
+            keepalive_timeout: seconds an idle connection is kept open
+            max_logins: the maximum number of logins running at once
+            max_sessions: the maximum number of live sessions, beyond which the least
+                recently used one is evicted
+            idle_timeout: seconds after which an unused session is evicted
+            reap_interval: seconds between two checks for idle sessions
+            keepalive_interval: seconds between two pings of the recently used
+                sessions, or None to not ping
+            keepalive_window: seconds a session counts as recently used
+        """
+
+        self.sessions: OrderedDict[str, aiohttp.ClientSession] = OrderedDict()
+        self.last_used: dict[str, float] = {}
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.reap_interval = reap_interval
+        self.keepalive_interval = keepalive_interval
+        self.keepalive_window = keepalive_window
+        self.tasks: list[asyncio.Task] = []
+        self.logins: dict[str, asyncio.Task[aiohttp.ClientSession]] = {}
+        self.renewals: dict[str, asyncio.Task[None]] = {}
+        self.generations: dict[str, int] = {}
+        # the username and password of each session, as either may hold ":"
+        self.credentials: dict[str, tuple[str, str]] = {}
+        self.login_semaphore = asyncio.Semaphore(max_logins)
+        self.store = store
+        self.connector_options = dict(
+            limit=limit,
+            limit_per_host=limit_per_host,
+            ttl_dns_cache=ttl_dns_cache,
+            keepalive_timeout=keepalive_timeout,
+        )
+        self.connector: aiohttp.TCPConnector | None = None
+
+    def get_connector(self) -> aiohttp.TCPConnector:
+        """
+        Get the connector shared by all sessions.
+
+        Every session talks to the same few hosts, so they share one connection
+        pool and DNS cache, while each keeps its own cookie jar.
+        """
+
+        if self.connector is None or self.connector.closed:
+            self.connector = aiohttp.TCPConnector(**self.connector_options)
+        return self.connector
+
+    def pool_stats(self) -> dict[str, Any]:
+        """
+        Get the saturation of the shared connection pool.
+
+        Returns:
+            the limits, and the number of acquired and idle connections in total
+            and per host
+        """
+
+        connector = self.connector
+        if connector is None or connector.closed:
+            return dict(
+                limit=self.connector_options["limit"],
+                limit_per_host=self.connector_options["limit_per_host"],
+                acquired=0,
+                idle=0,
+                waiting=0,
+                hosts={},
+            )
+        return dict(
+            limit=connector.limit,
+            limit_per_host=connector.limit_per_host,
+            acquired=len(connector._acquired),
+            idle=sum(len(conns) for conns in connector._conns.values()),
+            waiting=sum(len(waiters) for waiters in connector._waiters.values()),
+            hosts={
+                key.host: dict(
+                    acquired=len(connector._acquired_per_host.get(key, ())),
+                    idle=len(connector._conns.get(key, ())),
+                )
+                for key in {*connector._acquired_per_host, *connector._conns}
+            },
+        )
 
     async def get_session(self, username: str, password: str) -> aiohttp.ClientSession:
         session_key = f"{username}:{password}"
+        if session_key in self.renewals:
+            await asyncio.shield(self.renewals[session_key])
         if session_key in self.sessions:
+            self.sessions.move_to_end(session_key)
+            self.last_used[session_key] = time.monotonic()
             return self.sessions[session_key]
 
+        # concurrent requests of the same user share one login
+        task = self.logins.get(session_key)
+        if task is None:
+            task = asyncio.ensure_future(
+                self.create_session(username, password, session_key)
+            )
+            self.logins[session_key] = task
+        return await join(task)
+
+    def peek_session(
+        self, username: str, password: str
+    ) -> aiohttp.ClientSession | None:
+        """
+        Get the live session of a user without logging in.
+        """
+
+        return self.sessions.get(f"{username}:{password}")
+
+    async def create_session(
+        self, username: str, password: str, session_key: str
+    ) -> aiohttp.ClientSession:
         cookie_jar = aiohttp.CookieJar(unsafe=True)
         session = aiohttp.ClientSession(
+            connector=self.get_connector(),
+            connector_owner=False,
             cookie_jar=cookie_jar,
             headers={
                 "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36"
             },
         )
-        await self.login(password, username, session)
+        try:
+            async with self.login_semaphore:
+                if not await self.restore(session_key, session):
+                    await self.login(password, username, session)
+        except BaseException:
+            await session.close()
+            raise
+        finally:
+            del self.logins[session_key]
 
         self.sessions[session_key] = session
+        self.last_used[session_key] = time.monotonic()
+        self.generations[session_key] = 0
+        self.credentials[session_key] = (username, password)
+        while len(self.sessions) > self.max_sessions:
+            await self.evict(next(iter(self.sessions)))
         return session
 
+    async def restore(self, session_key: str, session: aiohttp.ClientSession) -> bool:
+        """
+        Restore a session from the store, if it is still accepted upstream.
+
+        Args:
+            session_key: the key of the session
+            session: a fresh session to load the stored cookies into
+
+        Returns:
+            whether the session was restored; if not, it must be logged in
+        """
+
+        if self.store is None:
+            return False
+        state = await self.store.load(session_key)
+        if state is None:
+            return False
+        cookies, context = state
+        load_cookies(session.cookie_jar, cookies)
+        try:
+            if await resume(session, context):
+                return True
+        except aiohttp.ClientError:
+            pass
+        session.cookie_jar.clear()
+        await self.store.delete(session_key)
+        return False
+
+    async def call(
+        self,
+        username: str,
+        password: str,
+        fn: Callable[[aiohttp.ClientSession], Awaitable[V]],
+    ) -> V:
+        """
+        Call a function with the session of a user, logging in again and replaying
+        the call once if the upstream session turns out to have expired.
+
+        Args:
+            username: the username of the user
+            password: the password of the user
+            fn: the function to call with the session
+
+        Returns:
+            the result of the function
+        """
+
+        session_key = f"{username}:{password}"
+        session = await self.get_session(username, password)
+        generation = self.generations[session_key]
+        try:
+            return await fn(session)
+        except SessionExpiredException:
+            await self.renew(username, password, generation)
+            return await fn(await self.get_session(username, password))
+
+    async def renew(self, username: str, password: str, generation: int):
+        """
+        Log an expired session in again and redo its handshake.
+
+        Every request that saw the session expire asks for a renewal, but only the
+        first one for a given generation of the session logs in.
+
+        Args:
+            username: the username of the user
+            password: the password of the user
+            generation: the generation of the session that expired
+        """
+
+        session_key = f"{username}:{password}"
+        task = self.renewals.get(session_key)
+        if task is None:
+            if self.generations.get(session_key) != generation:
+                return
+            task = asyncio.ensure_future(self.relogin(username, password))
+            self.renewals[session_key] = task
+        # a renewal is cheap and the session is shared, so it is finished even if
+        # every request waiting for it is cancelled
+        await asyncio.shield(task)
+
+    async def relogin(self, username: str, password: str):
+        session_key = f"{username}:{password}"
+        session = self.sessions[session_key]
+        try:
+            invalidate(session)
+            session.cookie_jar.clear()
+            async with self.login_semaphore:
+                await self.login(password, username, session)
+            await bootstrap(session)
+        except asyncio.CancelledError:
+            # leave the session in place, as the next expiry renews it again
+            raise
+        except BaseException:
+            if self.remove(session_key) is session:
+                await session.close()
+            raise
+        else:
+            self.generations[session_key] += 1
+        finally:
+            del self.renewals[session_key]
+
     @staticmethod
     async def login(password: str, username: str, session: aiohttp.ClientSession):
         async with session.post(
@@ -40,16 +293,141 @@ class SessionManager:
                 await session.close()
                 raise LoginFailedException("Failed to login", r)
 
+    async def save(self):
+        """
+        Save every session that finished its handshake to the store.
+        """
+
+        if self.store is None:
+            return
+        # logins and evictions may change the sessions while one is saved
+        for session_key, session in list(self.sessions.items()):
+            context = bootstrap.peek(session)
+            if context is not None:
+                await self.store.save(session_key, session.cookie_jar, context)
+
+    def remove(self, session_key: str) -> aiohttp.ClientSession | None:
+        """
+        Remove a session from the manager and the spider caches, without closing it.
+
+        Args:
+            session_key: the key of the session
+
+        Returns:
+            the removed session, if there was one
+        """
+
+        session = self.sessions.pop(session_key, None)
+        if session is not None:
+            del self.last_used[session_key]
+            del self.generations[session_key]
+            del self.credentials[session_key]
+            forget(session)
+        return session
+
+    async def evict(self, session_key: str):
+        """
+        Close a session, keeping it in the store to be restored on its next use.
+
+        Args:
+            session_key: the key of the session
+        """
+
+        session = self.sessions.get(session_key)
+        if session is None:
+            return
+        if self.store is not None and (context := bootstrap.peek(session)):
+            await self.store.save(session_key, session.cookie_jar, context)
+        if self.remove(session_key) is session:
+            await session.close()
+
+    async def reap(self):
+        """
+        Evict idle sessions every `reap_interval` seconds.
+        """
+
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            deadline = time.monotonic() - self.idle_timeout
+            for session_key in [
+                k for k, t in self.last_used.items() if t < deadline
+            ]:
+                try:
+                    await self.evict(session_key)
+                except Exception:
+                    # one failed eviction must not stop the reaper
+                    LOGGER.exception("Failed to evict an idle session")
+
+    async def keepalive(self):
+        """
+        Ping the recently used sessions every `keepalive_interval` seconds, so they
+        do not time out upstream, and renew the ones that already did.
+        """
+
+        while True:
+            await asyncio.sleep(self.keepalive_interval)
+            since = time.monotonic() - self.keepalive_window
+            for session_key, session in list(self.sessions.items()):
+                if self.last_used.get(session_key, 0) < since:
+                    continue
+                try:
+                    if not await ping(session):
+                        # the session may have been evicted during the ping
+                        generation = self.generations.get(session_key)
+                        if generation is None:
+                            continue
+                        username, password = self.credentials[session_key]
+                        await self.renew(username, password, generation)
+                except (aiohttp.ClientError, asyncio.TimeoutError, SpiderIOException):
+                    pass
+
+    def start(self):
+        """
+        Start evicting idle sessions, and pinging active ones if enabled, in the
+        background.
+        """
+
+        if not self.tasks:
+            self.tasks.append(asyncio.create_task(self.reap()))
+            if self.keepalive_interval is not None:
+                self.tasks.append(asyncio.create_task(self.keepalive()))
+
+    def memory_stats(self) -> list[dict[str, Any]]:
+        """
+        Get the memory held by each live session, least recently used first.
+
+        Returns:
+            the username, idle seconds and approximate cached bytes of each session
+        """
+
+        now = time.monotonic()
+        return [
+            dict(
+                username=self.credentials[session_key][0],
+                idle=now - self.last_used[session_key],
+                cached=footprint(session),
+            )
+            for session_key, session in self.sessions.items()
+        ]
+
     async def cleanup_session(self, username: str, password: str):
         session_key = f"{username}:{password}"
-        if session_key in self.sessions:
-            await self.sessions[session_key].close()
-            del self.sessions[session_key]
+        session = self.remove(session_key)
+        if session is not None:
+            await session.close()
+        if self.store is not None:
+            await self.store.delete(session_key)
 
     async def cleanup(self):
-        for session in self.sessions.values():
-            await session.close()
-        self.sessions = {}
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+        await self.save()
+        for session_key in list(self.sessions):
+            await self.remove(session_key).close()
+        if self.connector is not None:
+            await self.connector.close()
+            self.connector = None
 
 
 manager = SessionManager()
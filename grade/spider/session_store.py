@@ -0,0 +1,124 @@
+import asyncio
+import base64
+import hashlib
+import json
+import secrets
+from http.cookies import SimpleCookie
+from pathlib import Path
+from typing import Any
+
+from aiohttp.abc import AbstractCookieJar
+from yarl import URL
+
+from .model import VueContext
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except ImportError:
+    Fernet = None
+
+
+class SessionStore:
+    """
+    An on-disk store of the cookies and vue context of each session.
+
+    Each entry is named by a salted scrypt hash of the credentials and encrypted
+    with a key derived from the same credentials, so an entry can only be found and
+    read by someone presenting the credentials it belongs to.
+    """
+
+    def __init__(self, path: str | Path):
+        if Fernet is None:
+            raise ImportError("SessionStore requires the cryptography package")
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        salt_path = self.path / "salt"
+        if not salt_path.exists():
+            salt_path.write_bytes(secrets.token_bytes(16))
+        self.salt = salt_path.read_bytes()
+        self.keys: dict[str, tuple[Path, Fernet]] = {}
+
+    async def _key(self, session_key: str) -> tuple[Path, Fernet]:
+        if session_key not in self.keys:
+            digest = await asyncio.to_thread(
+                hashlib.scrypt,
+                session_key.encode("utf-8"),
+                salt=self.salt,
+                n=2**14,
+                r=8,
+                p=1,
+                dklen=64,
+            )
+            self.keys[session_key] = (
+                self.path / f"{digest[:32].hex()}.session",
+                Fernet(base64.urlsafe_b64encode(digest[32:])),
+            )
+        return self.keys[session_key]
+
+    async def load(
+        self, session_key: str
+    ) -> tuple[list[str], VueContext] | None:
+        """
+        Load the stored state of a session.
+
+        Args:
+            session_key: the key of the session in the session manager
+
+        Returns:
+            the cookies and the vue context, or None if nothing usable is stored
+        """
+
+        path, fernet = await self._key(session_key)
+        try:
+            state = json.loads(fernet.decrypt(path.read_bytes()))
+        except (OSError, InvalidToken, ValueError):
+            return None
+        return state["cookies"], VueContext(
+            base_url=URL(state["base_url"]),
+            navigations=[(k, URL(v)) for k, v in state["navigations"]],
+            grade_book_url=URL(state["grade_book_url"]),
+        )
+
+    async def save(
+        self,
+        session_key: str,
+        cookie_jar: AbstractCookieJar,
+        context: VueContext,
+    ) -> None:
+        """
+        Save the state of a session.
+
+        Args:
+            session_key: the key of the session in the session manager
+            cookie_jar: the cookies of the session
+            context: the vue context of the session
+        """
+
+        path, fernet = await self._key(session_key)
+        state: dict[str, Any] = dict(
+            cookies=[morsel.OutputString() for morsel in cookie_jar],
+            base_url=str(context["base_url"]),
+            navigations=[(k, str(v)) for k, v in context["navigations"]],
+            grade_book_url=str(context["grade_book_url"]),
+        )
+        path.write_bytes(fernet.encrypt(json.dumps(state).encode("utf-8")))
+
+    async def delete(self, session_key: str) -> None:
+        path, _ = await self._key(session_key)
+        path.unlink(missing_ok=True)
+
+
+def load_cookies(cookie_jar: AbstractCookieJar, cookies: list[str]):
+    """
+    Load cookies saved by `SessionStore.save` into a cookie jar.
+    """
+
+    for cookie in cookies:
+        morsels = SimpleCookie()
+        morsels.load(cookie)
+        for morsel in morsels.values():
+            domain = morsel["domain"].lstrip(".")
+            if domain:
+                cookie_jar.update_cookies(
+                    {morsel.key: morsel}, URL.build(scheme="https", host=domain)
+                )
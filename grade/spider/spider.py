@@ -1,15 +1,22 @@
 import asyncio
+import hashlib
 import json
 import re
 from contextlib import asynccontextmanager
 from typing import Any, Literal
+from weakref import WeakKeyDictionary
 
 import aiohttp
 from lxml.etree import HTML
 from yarl import URL
 
-from .constants import DASHBOARD_URL
-from .exception import SpiderIOException
+from . import selectors
+from .constants import COURSE_TTL, DASHBOARD_URL, GRADE_BOOK_TTL
+from .course_cache import CourseCache
+from .exception import SessionExpiredException, SpiderIOException
+from .grade_book import GradeBook
+from .model import VueContext
+from .parse import parse_grade_book_items_df
 from grade.utils import (
     cached,
     chunked,
@@ -17,10 +24,89 @@ from grade.utils import (
     first,
     get_var,
     identifier,
+    parse_until,
+    sizeof,
     submit,
 )
 
-multicached = cached(128)
+caches = []
+
+
+def multicached(fn=None, /, *, ttl: float | None = None):
+    if fn is None:
+        return lambda fn: multicached(fn, ttl=ttl)
+    cache = cached(128, lru=True, ttl=ttl)(fn)
+    caches.append(cache)
+    return cache
+
+
+def invalidate(s: aiohttp.ClientSession) -> None:
+    """
+    Drop the cached results of a session.
+
+    Args:
+        s: the session
+    """
+
+    for cache in caches:
+        cache.discard(s)
+
+
+def forget(s: aiohttp.ClientSession) -> None:
+    """
+    Drop everything kept for a session, so a discarded session is not kept alive by
+    the caches.
+
+    Args:
+        s: the session
+    """
+
+    invalidate(s)
+    course_locks.pop(s, None)
+    course_data.invalidate(s)
+
+
+def refresh(s: aiohttp.ClientSession) -> None:
+    """
+    Make the next call fetch the grade book page again, instead of waiting for the
+    cached one to expire.
+
+    Args:
+        s: the session
+    """
+
+    grade_book.discard(s)
+    courses.discard(s)
+
+
+def is_expired(r: aiohttp.ClientResponse) -> bool:
+    """
+    Check whether a response shows that the upstream session has expired, i.e. it
+    was refused or redirected to a login page.
+    """
+
+    return (
+        r.status in (401, 403, 440)
+        or "login" in r.url.path.lower()
+        or any("login" in h.url.path.lower() for h in r.history)
+    )
+
+
+def footprint(s: aiohttp.ClientSession) -> int:
+    """
+    Approximate the memory held by the cached results of a session.
+
+    Args:
+        s: the session
+
+    Returns:
+        the size in bytes
+    """
+
+    seen = set()
+    return sizeof(course_data.peek(s), seen) + sum(
+        sizeof(r, seen) for cache in caches if (r := cache.peek(s)) is not None
+    )
 
 
 def resolve_url(url: str | URL, base_url: URL) -> URL:
@@ -37,6 +123,8 @@ def resolve_url(url: str | URL, base_url: URL) -> URL:
 async def apps(s: aiohttp.ClientSession) -> list[tuple[str, URL]]:
     url = DASHBOARD_URL / "dca" / "student" / "dashboard"
     async with s.get(url) as r:
+        if is_expired(r):
+            raise SessionExpiredException("Session expired", r)
         text = await r.text()
         html = HTML(text)
         apps = [
@@ -45,10 +133,8 @@ async def apps(s: aiohttp.ClientSession) -> list[tuple[str, URL]]:
                 resolve_url(href, DASHBOARD_URL),
             )
             for name, href in [
-                (first(li.xpath("a/span/text()")), first(li.xpath("a/@href")))
-                for li in html.xpath(
-                    '//*[text()="MY eCLASS Apps"]/following-sibling::ul/li'
-                )
+                (first(selectors.APP_NAME(li)), first(selectors.APP_HREF(li)))
+                for li in selectors.APPS(html)
             ]
             if href and name
         ]
@@ -67,66 +153,130 @@ async def vue(s: aiohttp.ClientSession):
         return r.url.parent, await r.text()
 
 
-@multicached
-async def vue_base_url(s: aiohttp.ClientSession):
-    VUE_BASE_URL, _ = await vue(s)
-    return VUE_BASE_URL
+def vue_script(html_raw: str) -> str:
+    script = parse_until(html_raw, "script", selectors.is_head_script)
+    if script is None:
+        raise ValueError("Cannot find the head script")
+    return script.text
 
 
-async def vue_script(s: aiohttp.ClientSession):
-    _, html_raw = await vue(s)
-    html = HTML(html_raw.encode("utf-8"))
-    script = html.xpath("//head/script[1]/text()")[0]
-    return script
+@multicached
+async def bootstrap(s: aiohttp.ClientSession) -> VueContext:
+    """
+    Run the StudentVUE handshake of a session.
 
+    The handshake (apps page, vue link, form submit) is done once per session, and
+    everything later requests need from it is kept in the returned context.
 
-@multicached
-async def grade_book_url(s: aiohttp.ClientSession):
-    return find(await navigations(s), "grade_book")
+    Args:
+        s: the session
 
+    Returns:
+        the vue context of the session
+    """
 
-@multicached
-async def navigations(s: aiohttp.ClientSession):
-    return [
+    base_url, html_raw = await vue(s)
+    navigations = [
         (
             identifier(nav.get("description")),
-            resolve_url(URL(nav.get("url")), await vue_base_url(s)),
+            resolve_url(URL(nav.get("url")), base_url),
         )
-        for nav in get_var("PXP.NavigationData", await vue_script(s))["items"]
+        for nav in get_var("PXP.NavigationData", vue_script(html_raw))["items"]
     ]
+    return VueContext(
+        base_url=base_url,
+        navigations=navigations,
+        grade_book_url=find(navigations, "grade_book"),
+    )
 
 
-@multicached
+async def vue_base_url(s: aiohttp.ClientSession) -> URL:
+    return (await bootstrap(s))["base_url"]
+
+
+async def navigations(s: aiohttp.ClientSession) -> list[tuple[str, URL]]:
+    return (await bootstrap(s))["navigations"]
+
+
+async def grade_book_url(s: aiohttp.ClientSession) -> URL:
+    return (await bootstrap(s))["grade_book_url"]
+
+
+@multicached(ttl=GRADE_BOOK_TTL)
 async def grade_book(s: aiohttp.ClientSession):
     async with s.get(await grade_book_url(s)) as r:
+        if is_expired(r):
+            raise SessionExpiredException("Session expired", r)
         text = await r.text()
-        return HTML(text.encode("utf-8"))
+        return grade_book_content(text)
 
 
-@multicached
+def grade_book_content(text: str):
+    return parse_until(text, "div", selectors.is_grade_book_content)
+
+
+async def resume(s: aiohttp.ClientSession, context: VueContext) -> bool:
+    """
+    Resume a session restored from disk, skipping the handshake.
+
+    The grade book page doubles as the probe: if the upstream session is still
+    alive, the page and the context are cached as if the session had done the
+    handshake itself.
+
+    Args:
+        s: the restored session
+        context: the stored vue context of the session
+
+    Returns:
+        whether the session is still alive
+    """
+
+    async with s.get(context["grade_book_url"], allow_redirects=False) as r:
+        if r.status != 200:
+            return False
+        text = await r.text()
+    html = grade_book_content(text)
+    if html is None:
+        return False
+    bootstrap.set(context, s)
+    grade_book.set(html, s)
+    return True
+
+
+async def ping(s: aiohttp.ClientSession) -> bool:
+    """
+    Check that the upstream session is still alive, which also keeps it from timing
+    out.
+
+    Args:
+        s: the session
+
+    Returns:
+        whether the session is alive; a session without a handshake yet counts as
+        alive, as there is nothing to keep warm
+    """
+
+    context = bootstrap.peek(s)
+    if context is None:
+        return True
+    async with s.get(context["grade_book_url"], allow_redirects=False) as r:
+        return r.status == 200 and not is_expired(r)
+
+
+@multicached(ttl=GRADE_BOOK_TTL)
 async def courses(s: aiohttp.ClientSession) -> list[dict[str, Any]]:
     html = await grade_book(s)
-    rows = chunked(
-        html.xpath(
-            '//div[@id="gradebook-content"]'
-            '//div[contains(@class, "header")]'
-            '/following-sibling::div[div[contains(@class, "row")]]'
-            "/div"
-        ),
-        2,
-    )
+    if html is None:
+        return []
+    rows = chunked(selectors.COURSE_ROWS(html), 2)
     email = re.compile(r"[\w.-]+@[\w.-]+")
     result = [
         dict(
-            course=first(header.xpath("div[1]/button/text()")),
-            teacher=first(
-                header.xpath('.//span[contains(@class, "teacher")]//a/text()')
-            ),
-            grade=first(content.xpath('.//span[contains(@class, "mark")]/text()')),
-            params=(params := json.loads(first(header.xpath(".//button/@data-focus")))),
-            email=email.search(
-                first(header.xpath('.//span[contains(@class, "teacher")]//a/@href'))
-            ).group(0),
+            course=first(selectors.COURSE_NAME(header)),
+            teacher=first(selectors.TEACHER_NAME(header)),
+            grade=first(selectors.MARK(content)),
+            params=(params := json.loads(first(selectors.FOCUS(header)))),
+            email=email.search(first(selectors.TEACHER_HREF(header))).group(0),
             id=params["FocusArgs"]["classID"],
         )
         for header, content in rows
@@ -146,6 +296,8 @@ async def load_control(
         json=data,
         headers={"X-Requested-With": "XMLHttpRequest"},
     ) as r:
+        if is_expired(r):
+            raise SessionExpiredException("Session expired", r)
         if not r.ok:
             raise SpiderIOException(f'Failed to load "{control_name}"', r)
         return await r.json()
@@ -159,7 +311,31 @@ async def load_course(s: aiohttp.ClientSession, course):
     )
 
 
-course_lock = asyncio.Lock()
+course_locks: WeakKeyDictionary[aiohttp.ClientSession, asyncio.Lock]
+course_locks = WeakKeyDictionary()
+
+
+def course_lock(s: aiohttp.ClientSession) -> asyncio.Lock:
+    """
+    Get the course lock of a session.
+
+    StudentVUE remembers the loaded course per session, so a `load_course` and the
+    api calls that follow it must not interleave with another course of the same
+    session. Different sessions never share that state, so each one gets its own
+    lock and courses of different users are fetched in parallel. The lock is FIFO,
+    which keeps the requests of one user in order.
+
+    Args:
+        s: the session
+
+    Returns:
+        the lock guarding the loaded course of the session
+    """
+
+    lock = course_locks.get(s)
+    if lock is None:
+        lock = course_locks[s] = asyncio.Lock()
+    return lock
 
 
 @asynccontextmanager
@@ -167,7 +343,7 @@ async def course(s: aiohttp.ClientSession, query: dict[str, any] | int | str):
     query = await resolve_course(s, query)
     if not query:
         raise ValueError("No course found")
-    async with course_lock:
+    async with course_lock(s):
         await load_course(s, query)
         yield
 
@@ -226,6 +402,8 @@ async def call_api(s: aiohttp.ClientSession, action: str, data: dict[str, Any])
         "X-Requested-With": "XMLHttpRequest",
     }
     async with s.post(url, json=data, headers=headers) as r:
+        if is_expired(r):
+            raise SessionExpiredException("Session expired", r)
         if not r.ok:
             name = data.get("FriendlyName", "Unknown")
             raise SpiderIOException(f'Failed to call "{name}"', r)
@@ -271,11 +449,69 @@ async def get_items(
     )
 
 
+def fingerprint(c: dict[str, Any]) -> str:
+    """
+    Fingerprint a course by its row in the grade book page, which changes whenever
+    its grade does.
+
+    Args:
+        c: the course, as returned by `courses`
+
+    Returns:
+        the fingerprint
+    """
+
+    row = json.dumps([c.get("grade"), c.get("teacher"), c.get("params")])
+    return hashlib.blake2b(row.encode("utf-8"), digest_size=16).hexdigest()
+
+
+course_data: CourseCache[GradeBook] = CourseCache(COURSE_TTL)
+
+
 async def get_course_data(s: aiohttp.ClientSession, c) -> tuple[dict, dict]:
+    """
+    Fetch the class data and items of a course.
+
+    Args:
+        s: the session
+        c: the course, as returned by `courses`
+
+    Returns:
+        the class data and the items of the course
+    """
+
     async with course(s, c):
-        return await asyncio.gather(get_class_data(s), get_items(s))
+        return tuple(await asyncio.gather(get_class_data(s), get_items(s)))
 
 
-@multicached
-async def get_courses_data(s: aiohttp.ClientSession):
-    return await asyncio.gather(*(get_course_data(s, c) for c in await courses(s)))
+async def get_grade_book(
+    s: aiohttp.ClientSession, c, force: bool = False
+) -> GradeBook:
+    """
+    Get the grade book items of a course.
+
+    The items are cached per session and course in a compact `GradeBook`, and
+    reused as long as the fingerprint of the course is unchanged. The raw class
+    data and items are dropped once parsed.
+
+    Args:
+        s: the session
+        c: the course, as returned by `courses`
+        force: fetch the course even if its cached items are still valid
+
+    Returns:
+        the grade book items of the course
+    """
+
+    async def fetch() -> GradeBook:
+        return GradeBook(parse_grade_book_items_df(*await get_course_data(s, c)))
+
+    return await course_data(s, c["id"], fingerprint(c), fetch, force)
+
+
+async def get_grade_books(
+    s: aiohttp.ClientSession, force: bool = False
+) -> list[GradeBook]:
+    return await asyncio.gather(
+        *(get_grade_book(s, c, force) for c in await courses(s))
+    )
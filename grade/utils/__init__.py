@@ -1,9 +1,9 @@
-from .cache import cached
+from .cache import cached, join
 from .common import (
     find,
     first,
     get_var,
-    to_matched,
+    get_vars,
     extract_dict,
     identifier,
     flatten,
@@ -13,25 +13,30 @@ from .common import (
     rename,
     get,
     to_decimal,
+    sizeof,
 )
+from .html import parse_until
 from .submit import submit
 from .log import create_logger, LOGGER
-from .constants import DECIMAL_CONTEXT
+from .constants import DECIMAL_CONTEXT, DISPLAY_QUANTUM
 
 __all__ = [
     "cached",
+    "join",
     "find",
     "first",
     "get_var",
-    "to_matched",
+    "get_vars",
     "extract_dict",
     "identifier",
     "chunked",
     "submit",
+    "parse_until",
     "flatten",
     "compose",
     "strip",
     "rename",
     "get",
     "to_decimal",
+    "sizeof",
 ]
@@ -1,6 +1,11 @@
 from typing import TypeVar, ParamSpec, overload, Protocol, Any, cast
+from collections import OrderedDict
 from collections.abc import Callable, Awaitable
+from dataclasses import dataclass
 import asyncio
+import math
+import time
+from weakref import WeakKeyDictionary
 
 
 P = ParamSpec("P")
@@ -106,9 +111,165 @@ class MultiAsyncCache(AsyncCache[P, V]):
         self.result = {}
 
 
+waiters: WeakKeyDictionary[asyncio.Future, int] = WeakKeyDictionary()
+
+
+async def join(task: asyncio.Future[V]) -> V:
+    """
+    Wait for a task shared by several callers.
+
+    A caller that is cancelled stops waiting without cancelling the task, unless it
+    was the last caller waiting, so shared work is only abandoned once nobody wants
+    its result.
+
+    Args:
+        task: the shared task
+
+    Returns:
+        the result of the task
+    """
+
+    waiters[task] = waiters.get(task, 0) + 1
+    try:
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        if waiters[task] == 1:
+            task.cancel()
+        raise
+    finally:
+        waiters[task] -= 1
+        if not waiters[task]:
+            del waiters[task]
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+    stale: int = 0
+    evictions: int = 0
+
+
+class LRUAsyncCache(AsyncCache[P, V]):
+    """
+    An async cache that evicts the least recently used entry.
+
+    Concurrent misses of the same key share one in-flight call. Entries expire `ttl`
+    seconds after they are stored; for `stale` more seconds the expired value is
+    still returned, while a single background call revalidates it.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        fn: Callable[P, Awaitable[V]],
+        ttl: float | None = None,
+        stale: float = 0,
+    ) -> None:
+        if size <= 1:
+            raise ValueError("LRUAsyncCache only supports size > 1")
+        self.fn = fn
+        self.size = size
+        self.ttl = math.inf if ttl is None else ttl
+        self.stale = stale
+        self.result: OrderedDict[tuple[Any, ...], tuple[V, float]] = OrderedDict()
+        self.pending: dict[tuple[Any, ...], asyncio.Task[V]] = {}
+        self.stats = CacheStats()
+
+    async def __call__(self, *args: P.args, **kwargs: P.kwargs) -> V:
+        key = (args, tuple(kwargs.items()))
+        entry = self.result.get(key)
+        if entry is not None:
+            r, expires = entry
+            now = time.monotonic()
+            if now < expires:
+                self.result.move_to_end(key)
+                self.stats.hits += 1
+                return r
+            if now < expires + self.stale:
+                self.result.move_to_end(key)
+                self.stats.stale += 1
+                self._call(key, args, kwargs)
+                return r
+            del self.result[key]
+        if key in self.pending:
+            self.stats.coalesced += 1
+        else:
+            self.stats.misses += 1
+        return await join(self._call(key, args, kwargs))
+
+    def _call(
+        self, key: tuple[Any, ...], args: tuple[Any, ...], kwargs: dict[str, Any]
+    ) -> asyncio.Task[V]:
+        task = self.pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run(key, args, kwargs))
+            # a revalidation nobody waits for must not log an unretrieved exception
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self.pending[key] = task
+        return task
+
+    async def _run(
+        self, key: tuple[Any, ...], args: tuple[Any, ...], kwargs: dict[str, Any]
+    ) -> V:
+        try:
+            r = await self.fn(*args, **kwargs)
+        finally:
+            # a call that was cleared or discarded meanwhile must not be stored
+            current = self.pending.get(key) is asyncio.current_task()
+            if current:
+                del self.pending[key]
+        if current:
+            self._store(key, r)
+        return r
+
+    def peek(self, *args: P.args, **kwargs: P.kwargs) -> V | None:
+        """
+        Get a cached result without calling the function or touching the LRU order.
+        """
+
+        entry = self.result.get((args, tuple(kwargs.items())))
+        if entry is None or time.monotonic() >= entry[1] + self.stale:
+            return None
+        return entry[0]
+
+    def set(self, r: V, *args: P.args, **kwargs: P.kwargs) -> None:
+        """
+        Store a result obtained elsewhere, as if the function had returned it.
+        """
+
+        self._store((args, tuple(kwargs.items())), r)
+
+    def _store(self, key: tuple[Any, ...], r: V) -> None:
+        self.result[key] = (r, time.monotonic() + self.ttl)
+        self.result.move_to_end(key)
+        while len(self.result) > self.size:
+            self.result.popitem(last=False)
+            self.stats.evictions += 1
+
+    def discard(self, *args: P.args, **kwargs: P.kwargs) -> None:
+        """
+        Drop the cached result and any in-flight call of the given arguments.
+        """
+
+        key = (args, tuple(kwargs.items()))
+        self.result.pop(key, None)
+        self.pending.pop(key, None)
+
+    def clear(self) -> None:
+        self.result = OrderedDict()
+        self.pending = {}
+
+
 @overload
 def cached(
-    size: int, /
+    size: int,
+    /,
+    *,
+    lru: bool = False,
+    ttl: float | None = None,
+    stale: float = 0,
 ) -> Callable[[Callable[P, V]], SyncCache[P, V] | AsyncCache[P, V]]:
     ...
 
@@ -120,11 +281,31 @@ def cached(fn: Callable[P, V], /) -> SyncCache[P, V] | AsyncCache[P, V]:
 
 def cached(
     size: Callable[P, V] | int,
+    /,
+    *,
+    lru: bool = False,
+    ttl: float | None = None,
+    stale: float = 0,
 ) -> (
     Callable[[Callable[P, V]], SyncCache[P, V] | AsyncCache[P, V]]
     | SyncCache[P, V]
     | AsyncCache[P, V]
 ):
+    """
+    Cache the results of a function.
+
+    Args:
+        size: the maximum number of cached results, or the function to cache with
+            size 1
+        lru: for async functions with size > 1, use a single-flight LRU cache
+        ttl: seconds before an entry expires, implies `lru`
+        stale: seconds an expired entry is still served while revalidating,
+            implies `lru`
+
+    Returns:
+        the cached function, or a decorator that creates it
+    """
+
     if callable(size):
         return cached(1)(size)
 
@@ -132,6 +313,8 @@ def cached(
         nonlocal size
         size = cast(int, size)
         if asyncio.iscoroutinefunction(fn):
+            if size > 1 and (lru or ttl is not None or stale):
+                return LRUAsyncCache(size, fn, ttl, stale)
             if size == 1:
                 return SingleAsyncCache(size, fn)
             else:
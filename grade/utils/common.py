@@ -1,9 +1,13 @@
 import json
 import re
+import sys
 from collections.abc import Iterable, Mapping
 from typing import Any, cast, TypeVar
 from typing import Callable
 from decimal import Decimal, DecimalException
+from functools import lru_cache
+
+from lxml import etree
 
 from .constants import DECIMAL_CONTEXT
 
@@ -30,49 +34,59 @@ def find(
     return first((v for k, v in iterable if k == s), default)
 
 
-def to_matched(
-    s: str,
-    start: int = 0,
-    end: int = -1,
-    patterns: tuple[tuple[str, str]] = (
-        ("(", ")"),
-        ("[", "]"),
-        ("{", "}"),
-    ),
-) -> int:
-    if end == -1:
-        end = len(s)
-    start_chars, end_chars = (set(x) for x in zip(*patterns, strict=True))
-    end2start = {v: k for k, v in patterns}
-
-    stk = []
-    if s[start] not in start_chars:
-        raise ValueError(f"Expected start char, got {s[start]}")
-    stk.append(s[start])
-    start += 1
-    while start < end:
-        if s[start] in start_chars:
-            stk.append(s[start])
-        elif s[start] in end_chars:
-            if stk[-1] != end2start[s[start]]:
-                raise ValueError(f"Expected {stk[-1]}, got {s[start]}")
-            stk.pop()
-            if not stk:
-                return start
-        start += 1
-    if stk:
-        raise ValueError(f"Expected {stk[-1]}, got EOF")
-    return end
+_decoder = json.JSONDecoder()
+
+
+@lru_cache
+def _var_pattern(var_names: tuple[str, ...]) -> re.Pattern[str]:
+    names = "|".join(re.escape(name) for name in var_names)
+    # no lookbehind for the character before the name, as it would keep the
+    # engine from skipping ahead to the names; `get_vars` checks it instead
+    return re.compile(rf"({names})\s*=(?!=)\s*")
+
+
+_IDENTIFIER_CHARS = re.compile(r"[\w.$]")
+
+
+def get_vars(script: str, *var_names: str) -> dict[str, Any]:
+    """
+    Get the JSON literals assigned to JavaScript variables in a script.
+
+    All variables are found in one pass over the script. Each literal is decoded in
+    place by the JSON decoder, which skips it as a whole, so brackets or quotes
+    inside strings are handled correctly.
+
+    Args:
+        script: the script to search
+        var_names: the names of the variables, e.g. "PXP.NavigationData"
+
+    Returns:
+        the decoded value of each variable, by name
+    """
+
+    pattern = _var_pattern(var_names)
+    result = {}
+    pos = 0
+    while len(result) < len(var_names) and (match := pattern.search(script, pos)):
+        pos = match.end()
+        if match.group(1) in result:
+            continue
+        start = match.start()
+        if start and _IDENTIFIER_CHARS.match(script, start - 1):
+            # the end of a longer name, like `X.PXP.User`
+            pos = start + 1
+            continue
+        try:
+            result[match.group(1)], pos = _decoder.raw_decode(script, pos)
+        except json.JSONDecodeError:
+            continue
+    if missing := [name for name in var_names if name not in result]:
+        raise ValueError(f"Cannot find {', '.join(missing)}")
+    return result
 
 
 def get_var(var_name: str, script: str) -> Any:
-    match = re.search(re.escape(var_name) + r"\s*=\s*", script)
-    if not match:
-        raise ValueError(f"Cannot find {var_name}")
-    st = match.end()
-    ed = to_matched(script, st)
-    data = json.loads(script[st: ed + 1])
-    return data
+    return get_vars(script, var_name)[var_name]
 
 
 def extract_dict(
@@ -176,3 +190,30 @@ def to_decimal(v) -> Decimal:
         return Decimal(v, DECIMAL_CONTEXT)
     except (DecimalException, TypeError):
         return Decimal("NaN", DECIMAL_CONTEXT)
+
+
+def sizeof(o: Any, seen: set[int] | None = None) -> int:
+    """
+    Approximate the memory held by an object, following containers.
+
+    Args:
+        o: the object to measure
+        seen: ids of the objects already counted
+
+    Returns:
+        the size in bytes. lxml trees are measured by their serialized size, as
+        their nodes live outside the Python heap.
+    """
+
+    seen = set() if seen is None else seen
+    if id(o) in seen:
+        return 0
+    seen.add(id(o))
+    if isinstance(o, etree._Element):
+        return len(etree.tostring(o))
+    size = sys.getsizeof(o)
+    if isinstance(o, Mapping):
+        size += sum(sizeof(k, seen) + sizeof(v, seen) for k, v in o.items())
+    elif isinstance(o, (list, tuple, set, frozenset)):
+        size += sum(sizeof(v, seen) for v in o)
+    return size
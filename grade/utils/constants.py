@@ -1,6 +1,9 @@
-from decimal import Context, ROUND_HALF_UP
+from decimal import Context, Decimal, ROUND_HALF_UP
 
 DECIMAL_CONTEXT = Context(
     prec=100,
     rounding=ROUND_HALF_UP,
 )
+
+# the precision analysis results are shown with
+DISPLAY_QUANTUM = Decimal("0.01")
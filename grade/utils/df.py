@@ -1,26 +1,97 @@
-from typing import get_type_hints
+from collections.abc import Mapping, Sequence
+from functools import lru_cache
+from typing import Any, get_type_hints
 
 import pandas as pd
 from pandas import DataFrame
 
 
-def explode(df: pd.DataFrame, col: str, type: type) -> DataFrame:
-    return df.assign(
-        **{
-            f"{col}_{k}": df[col].apply(lambda dct: (dct or {}).get(k))
-            for k in list(get_type_hints(type).keys())
-        }
-    ).drop(col, axis=1)
-
-
-def condense(df: pd.DataFrame, col: str, type: type) -> DataFrame:
-    return df.assign(
-        **{
-            col: df.apply(
-                lambda row: {
-                    k: row[f"{col}_{k}"] for k in list(get_type_hints(type).keys())
-                },
-                axis=1,
-            )
-        }
-    ).drop([f"{col}_{k}" for k in list(get_type_hints(type).keys())], axis=1)
+@lru_cache
+def fields(type: type) -> tuple[str, ...]:
+    """
+    Get the field names of a TypedDict, cached per type.
+    """
+
+    return tuple(get_type_hints(type))
+
+
+def records_to_df(
+    records: Sequence[Mapping[str, Any]], index: str | None = None, **nested: type
+) -> DataFrame:
+    """
+    Build a DataFrame from records, flattening nested records into prefixed columns.
+
+    The columns are filled in one pass over the records, so no per-row or per-field
+    `apply` is needed.
+
+    Args:
+        records: the records
+        index: the column to use as index, if any
+        nested: the TypedDict of each nested record by key, e.g. comment=Comment;
+            its fields become `{key}_{field}` columns after the plain columns
+
+    Returns:
+        the DataFrame
+    """
+
+    n = len(records)
+    plain: dict[str, list] = {}
+    flat = {
+        key: {k: [None] * n for k in fields(type)} for key, type in nested.items()
+    }
+    for i, record in enumerate(records):
+        for k, v in record.items():
+            if k in flat:
+                if v:
+                    columns = flat[k]
+                    for kk, vv in v.items():
+                        if kk in columns:
+                            columns[kk][i] = vv
+            else:
+                if k not in plain:
+                    plain[k] = [None] * n
+                plain[k][i] = v
+    df = DataFrame(
+        {
+            **plain,
+            **{
+                f"{key}_{k}": column
+                for key, columns in flat.items()
+                for k, column in columns.items()
+            },
+        },
+        index=pd.RangeIndex(n),
+    )
+    return df if index is None else df.set_index(index)
+
+
+def df_to_records(df: pd.DataFrame, **nested: type) -> list[dict[str, Any]]:
+    """
+    Build records from a DataFrame, nesting prefixed columns into records; the
+    reverse of `records_to_df`.
+
+    Args:
+        df: the DataFrame; a named index is kept as a field
+        nested: the TypedDict of each nested record by key, e.g. comment=Comment
+
+    Returns:
+        the records
+    """
+
+    if df.index.name is not None:
+        df = df.reset_index()
+    nested_columns = {
+        key: [f"{key}_{k}" for k in fields(type)] for key, type in nested.items()
+    }
+    flat = {c for columns in nested_columns.values() for c in columns}
+    keys = [c for c in df.columns if c not in flat]
+    columns = [df[c].tolist() for c in keys]
+    for key, type in nested.items():
+        keys.append(key)
+        columns.append(
+            [
+                dict(zip(fields(type), values))
+                for values in zip(*(df[c].tolist() for c in nested_columns[key]))
+            ]
+        )
+    return [dict(zip(keys, values)) for values in zip(*columns)]
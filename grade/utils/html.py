@@ -0,0 +1,40 @@
+from collections.abc import Callable
+
+from lxml import etree
+
+
+def parse_until(
+    html: str,
+    tag: str,
+    predicate: Callable[[etree._Element], bool] = lambda el: True,
+    encoding: str = "utf-8",
+    chunk_size: int = 64 * 1024,
+) -> etree._Element | None:
+    """
+    Parse HTML incrementally and stop at the end of the first matching element.
+
+    Only the part of the document up to that element is parsed, which saves most
+    of the work when the element is near the start of a large page.
+
+    Args:
+        html: the HTML to parse
+        tag: the tag of the element
+        predicate: whether a parsed element with that tag is the one to find
+        encoding: the encoding used to feed the parser
+        chunk_size: the number of characters fed to the parser at a time
+
+    Returns:
+        the element, complete with its descendants, or None if there is none
+    """
+
+    parser = etree.HTMLPullParser(events=("end",), tag=tag, encoding=encoding)
+    for i in range(0, len(html), chunk_size):
+        parser.feed(html[i : i + chunk_size].encode(encoding))
+        for _, el in parser.read_events():
+            if predicate(el):
+                return el
+    parser.close()
+    for _, el in parser.read_events():
+        if predicate(el):
+            return el
+    return None
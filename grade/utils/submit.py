@@ -1,10 +1,17 @@
 import aiohttp
-from lxml.etree import HTML, ElementBase
+from lxml.etree import ElementBase, XPath
 from yarl import URL
 
 from .common import first
+from .html import parse_until
 from .log import LOGGER
 
+FORM_ACTION = XPath("//form/@action")
+FORM_METHOD = XPath("//form/@method")
+INPUTS = XPath("//input")
+INPUT_NAME = XPath("@name")
+INPUT_VALUE = XPath("@value")
+
 
 class _Submit:
     def __init__(
@@ -31,13 +38,14 @@ class _Submit:
         html = self.html
         encoding = self.encoding
         if isinstance(html, str):
-            html = HTML(html.encode(encoding))
+            # the form is all we need, the rest of the page is not parsed
+            html = parse_until(html, "form", encoding=encoding)
 
-        url = URL(first(html.xpath("//form/@action")))
-        method = first(html.xpath("//form/@method"), "get").lower()
+        url = URL(first(FORM_ACTION(html)))
+        method = first(FORM_METHOD(html), "get").lower()
         data = {
-            first(input.xpath("@name")): first(input.xpath("@value"))
-            for input in html.xpath("//input")
+            first(INPUT_NAME(input)): first(INPUT_VALUE(input))
+            for input in INPUTS(html)
         }
         LOGGER.debug(f"Submitting {method.upper()} {url}")
         return await getattr(self.session, method)(url, data=data)
@@ -0,0 +1,192 @@
+import random
+from datetime import datetime
+from decimal import Decimal
+
+import pandas as pd
+import pytest
+
+from grade.server.analyze import (
+    calculate_report,
+    grade_book_items_to_df,
+    to_backend,
+    to_display,
+)
+from grade.spider.model import Comment, GradeBookItem, MeasureType
+from grade.utils import to_decimal
+
+NAN = to_decimal("NaN")
+
+
+def make_item(
+    id: int,
+    points: Decimal,
+    max_points: Decimal,
+    measure_type: MeasureType,
+    comment: Comment | None = None,
+    is_for_grade: bool = True,
+    is_hidden: bool = False,
+    is_missing: bool = False,
+) -> GradeBookItem:
+    return GradeBookItem(
+        id=id,
+        name=f"Item {id}",
+        points=points,
+        max_points=max_points,
+        score=NAN,
+        max_score=to_decimal(100),
+        due_date=datetime(2024, 1, 1 + id % 28),
+        is_for_grade=is_for_grade,
+        is_hidden=is_hidden,
+        is_missing=is_missing,
+        measure_type=measure_type,
+        comment=comment,
+    )
+
+
+def random_book(seed: int, n: int) -> pd.DataFrame:
+    """
+    Make a random grade book, with points in halves as teachers enter them.
+    """
+
+    r = random.Random(seed)
+    measure_types = [
+        MeasureType(
+            id=i,
+            name=f"Type {i}",
+            weight=to_decimal(r.choice([10, 20, 25, 30, 40, 60])),
+            drop_score=to_decimal(r.choice([0, 0, 0, 5])),
+        )
+        for i in range(r.randint(1, 4))
+    ]
+    comments = [
+        None,
+        Comment(
+            code="LATE",
+            content="Late",
+            assignment_value=NAN,
+            penalty_percent=to_decimal(r.choice([5, 10, 15])),
+        ),
+        Comment(
+            code="EX",
+            content="Excused",
+            assignment_value=to_decimal(r.randint(0, 10)),
+            penalty_percent=NAN,
+        ),
+    ]
+    items = []
+    for i in range(n):
+        max_points = to_decimal(r.choice([5, 10, 20, 50, 100]))
+        points = to_decimal(r.randint(0, int(max_points) * 2)) / 2
+        items.append(
+            make_item(
+                i,
+                points if r.random() < 0.9 else NAN,
+                max_points,
+                r.choice(measure_types),
+                r.choice(comments),
+                is_for_grade=r.random() < 0.9,
+                is_hidden=r.random() < 0.05,
+                is_missing=r.random() < 0.1,
+            )
+        )
+    return grade_book_items_to_df(items)
+
+
+def assert_same_display(df: pd.DataFrame):
+    expected = to_display(dict(calculate_report(to_backend(df, "decimal"))))
+    report = calculate_report(to_backend(df, "float"))
+    assert isinstance(report["score"], float)
+    assert to_display(dict(report)) == expected
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_float_matches_decimal_on_random_books(seed):
+    assert_same_display(random_book(seed, random.Random(seed).randint(1, 200)))
+
+
+def test_float_matches_decimal_on_a_large_book():
+    assert_same_display(random_book(-1, 20_000))
+
+
+@pytest.mark.parametrize(
+    "points, expected",
+    [
+        # 2.675, 1.005 and 0.145 are all just below the boundary as floats
+        ("2.675", "2.68"),
+        ("1.005", "1.01"),
+        ("0.145", "0.15"),
+        ("12.345", "12.35"),
+        ("99.995", "100.00"),
+        ("0.005", "0.01"),
+        ("2.665", "2.67"),
+    ],
+)
+def test_float_rounds_half_up_at_boundaries(points, expected):
+    measure_type = MeasureType(
+        id=1, name="Tests", weight=to_decimal(100), drop_score=to_decimal(0)
+    )
+    df = grade_book_items_to_df(
+        [make_item(1, to_decimal(points), to_decimal(100), measure_type)]
+    )
+    assert to_display(calculate_report(to_backend(df, "decimal"))["score"]) == (
+        Decimal(expected)
+    )
+    assert_same_display(df)
+
+
+def test_float_rounds_half_up_after_weighting():
+    # 80 * 0.3 + 1.05 * 0.7 = 24.735, which float puts below the boundary
+    tests = MeasureType(
+        id=1, name="Tests", weight=to_decimal(30), drop_score=to_decimal(0)
+    )
+    homework = MeasureType(
+        id=2, name="Homework", weight=to_decimal(70), drop_score=to_decimal(0)
+    )
+    df = grade_book_items_to_df(
+        [
+            make_item(1, to_decimal(80), to_decimal(100), tests),
+            make_item(2, to_decimal("1.05"), to_decimal(100), homework),
+        ]
+    )
+    report = calculate_report(to_backend(df, "decimal"))
+    assert to_display(report["score"]) == Decimal("24.74")
+    assert_same_display(df)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_score_is_the_sum_of_contributions(seed):
+    df = random_book(seed, 100)
+    for backend in ("decimal", "float"):
+        report = calculate_report(to_backend(df, backend))
+        assert to_display(report["score"]) == to_display(
+            sum(report["contrib"].values())
+        )
+
+
+@pytest.mark.parametrize("backend", ["decimal", "float"])
+def test_ungraded_measure_type_does_not_deflate_the_score(backend):
+    tests = MeasureType(
+        id=1, name="Tests", weight=to_decimal(80), drop_score=to_decimal(0)
+    )
+    final = MeasureType(
+        id=2, name="Final", weight=to_decimal(20), drop_score=to_decimal(0)
+    )
+    df = grade_book_items_to_df(
+        [
+            make_item(1, to_decimal(90), to_decimal(100), tests),
+            make_item(2, NAN, to_decimal(100), final, is_for_grade=False),
+        ]
+    )
+    report = calculate_report(to_backend(df, backend))
+    assert to_display(report["score"]) == Decimal("90.00")
+    assert to_display(sum(report["blame"].values())) == Decimal("1.00")
+    assert list(report["score_by_measure_type"]) == [1]
+
+
+def test_to_display_keeps_missing_values():
+    assert to_display(float("nan")).is_nan()
+    assert to_display(NAN).is_nan()
+    assert to_display([2.675, {"a": 0.145}]) == [
+        Decimal("2.68"),
+        {"a": Decimal("0.15")},
+    ]
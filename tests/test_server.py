@@ -0,0 +1,59 @@
+import asyncio
+import json
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+import grade.spider.facade as facade
+from grade.server.server import routes
+
+COURSES = [dict(id=5000, name="Course 0"), dict(id=5001, name="Course 1")]
+
+
+class Manager:
+    # stands in for the session manager, with no upstream behind it
+    async def call(self, username, password, fn):
+        return await fn(object())
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    async def courses(session):
+        return COURSES
+
+    async def get_grade_book(session, course, force):
+        return [dict(id=course["id"] * 10)]
+
+    monkeypatch.setattr(facade, "manager", Manager())
+    monkeypatch.setattr(facade, "courses", courses)
+    monkeypatch.setattr(facade, "get_grade_book", get_grade_book)
+
+
+async def get_lines(ids: str) -> tuple[int, list[dict]]:
+    app = web.Application()
+    app.add_routes(routes)
+    async with TestClient(TestServer(app)) as client:
+        r = await client.get(
+            "/courses/grade_book_items",
+            params=dict(ids=ids),
+            headers=dict(username="user", password="pw"),
+        )
+        text = await r.text()
+    if r.status != 200:
+        return r.status, []
+    return r.status, [json.loads(line) for line in text.splitlines()]
+
+
+def test_unknown_course_id_gives_an_error_line(upstream):
+    status, lines = asyncio.run(get_lines("5001,42"))
+    assert status == 200
+    assert lines[0] == dict(id=42, error="No course with id 42")
+    assert lines[1] == dict(id=5001, items=[dict(id=50010)])
+    # every line carries its id as the courses do
+    assert {type(line["id"]) for line in lines} == {int}
+
+
+def test_invalid_course_id_is_a_bad_request(upstream):
+    status, _ = asyncio.run(get_lines("5000,abc"))
+    assert status == 400
@@ -0,0 +1,123 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from grade.server.analyze import calculate_report
+from grade.server.what_if import WhatIf
+from grade.spider.model import GradeBookItem, MeasureType
+from grade.utils import to_decimal
+
+TESTS = MeasureType(id=0, name="Tests", weight=to_decimal(40), drop_score=None)
+CLASSWORK = MeasureType(id=1, name="Classwork", weight=to_decimal(60), drop_score=None)
+
+
+def make_item(
+    id: int, points: int | None, measure_type: MeasureType, is_for_grade: bool = True
+) -> GradeBookItem:
+    return GradeBookItem(
+        id=id,
+        name=f"Item {id}",
+        points=to_decimal(points),
+        max_points=to_decimal(100),
+        score=to_decimal("NaN"),
+        max_score=to_decimal(100),
+        due_date=datetime(2024, 1, 1 + id),
+        is_for_grade=is_for_grade,
+        is_hidden=False,
+        is_missing=False,
+        measure_type=measure_type,
+        comment=None,
+    )
+
+
+def make_what_if() -> WhatIf:
+    # tests average 55 and classwork 80, so the score is 55 * 0.4 + 80 * 0.6 = 70
+    return WhatIf.from_grade_book_items(
+        [make_item(1, 50, TESTS), make_item(2, 60, TESTS), make_item(3, 80, CLASSWORK)]
+    )
+
+
+def report_score(what_if: WhatIf) -> float:
+    df = pd.DataFrame.from_dict(what_if.items, orient="index")
+    return float(calculate_report(df)["score"])
+
+
+def assert_score(what_if: WhatIf, expected: float):
+    assert float(what_if.score) == pytest.approx(expected)
+    assert float(what_if.score) == pytest.approx(report_score(what_if))
+
+
+def test_undo_an_added_item_with_another_weight():
+    what_if = make_what_if()
+    assert_score(what_if, 70)
+    what_if.add(
+        "x",
+        dict(
+            points=50,
+            max_points=100,
+            max_score=100,
+            measure_type=dict(id=1, weight=10),
+        ),
+    )
+    # classwork keeps its weight and averages 65
+    assert_score(what_if, 55 * 0.4 + 65 * 0.6)
+    what_if.undo()
+    assert_score(what_if, 70)
+    what_if.redo()
+    assert_score(what_if, 55 * 0.4 + 65 * 0.6)
+
+
+def test_undo_moving_an_item_between_measure_types():
+    what_if = make_what_if()
+    what_if.update(2, dict(measure_type_id=1))
+    assert_score(what_if, 50 * 0.4 + 70 * 0.6)
+    what_if.update(2, dict(measure_type_id=0))
+    assert_score(what_if, 70)
+    what_if.undo()
+    assert_score(what_if, 50 * 0.4 + 70 * 0.6)
+    what_if.undo()
+    assert_score(what_if, 70)
+    what_if.redo()
+    assert_score(what_if, 50 * 0.4 + 70 * 0.6)
+    what_if.redo()
+    assert_score(what_if, 70)
+
+
+def test_undo_a_new_measure_type():
+    what_if = make_what_if()
+    what_if.add(
+        "x",
+        dict(
+            points=100,
+            max_points=100,
+            max_score=100,
+            measure_type=dict(id=2, weight=100),
+        ),
+    )
+    assert_score(what_if, (55 * 40 + 80 * 60 + 100 * 100) / 200)
+    what_if.remove(3)
+    assert_score(what_if, (55 * 40 + 100 * 100) / 140)
+    what_if.undo()
+    what_if.undo()
+    assert_score(what_if, 70)
+    what_if.redo()
+    what_if.redo()
+    assert_score(what_if, (55 * 40 + 100 * 100) / 140)
+
+
+def test_ungraded_measure_type_does_not_deflate_the_score():
+    tests = MeasureType(id=0, name="Tests", weight=to_decimal(80), drop_score=None)
+    final = MeasureType(id=1, name="Final", weight=to_decimal(20), drop_score=None)
+    what_if = WhatIf.from_grade_book_items(
+        [make_item(1, 90, tests), make_item(2, None, final, is_for_grade=False)]
+    )
+    assert_score(what_if, 90)
+    assert what_if.scenarios([1], [[90], [70]]) == pytest.approx(np.array([90, 70]))
+    # grading the final brings its weight in
+    what_if.update(2, dict(points=40, is_for_grade=True))
+    assert_score(what_if, 90 * 0.8 + 40 * 0.2)
+    assert what_if.scenarios([2], [[40], [90]]) == pytest.approx(
+        np.array([80, 90])
+    )